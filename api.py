@@ -1,12 +1,84 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Query, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
 from typing import List, Dict, Optional
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+import asyncio
+import os
 import uuid
 from datetime import datetime
 import json
+import threading
+import metrics
+from index_writer import IngestJobs
+from llm_client import AsyncLLMClient, LLMError
+from prompt_builder import PromptBuilder, load_tokenizer
+from rag.embedder import Embedder
+from rag.ingest import DOCUMENTS_INDEX, Ingestor
+from rag.retriever import HybridRetriever
+from rag.session_pool import SessionVectorStores
+from rag.vector_store import ReadOnlyVectorStore, VectorStore
+from session_locks import SessionLocks
+from storage import create_store
 
-app = FastAPI(title="AI Chatbot API", version="1.0.0")
+# Worker processes serving the API ($API_WORKERS, or `python api.py --workers N`).
+# With more than one they share the SQLite session store and only read the
+# vector stores; index_writer.py is the single process that writes them.
+API_WORKERS = int(os.environ.get("API_WORKERS", "1"))
+SHARED = API_WORKERS > 1
+LOCK_DIR = os.path.join("chat_sessions", "locks")
+# POST /ingest only reads files under this server directory ($INGEST_ROOT); unset, it is off
+INGEST_ROOT = os.environ.get("INGEST_ROOT")
+# Where `python api.py --workers N` has its processes share their /metrics histograms
+METRICS_DIR = os.path.join("chat_sessions", "metrics")
+
+# Embedding and FAISS work is CPU-bound and blocking, so it runs in this bounded pool
+RAG_WORKERS = 4
+rag_pool = ThreadPoolExecutor(max_workers=RAG_WORKERS, thread_name_prefix="rag")
+# Session storage calls block on SQLite too; their own pool keeps them from queueing behind RAG work
+STORE_WORKERS = 4
+store_pool = ThreadPoolExecutor(max_workers=STORE_WORKERS, thread_name_prefix="store")
+# Set up in lifespan(): one embedder shared by every session's VectorStore, one async LLM client
+vector_stores: Optional[SessionVectorStores] = None
+llm: Optional[AsyncLLMClient] = None
+# Ingested documents, searched alongside every session's own store
+documents: Optional[VectorStore] = None
+# job id -> {"id", "paths", "status", "progress", "error", "ingestor", "thread"} of POST /ingest jobs
+ingest_jobs: Dict[str, Dict] = {}
+ingest_lock = threading.Lock()
+# With several workers, POST /ingest jobs are queued here for the index writer instead
+shared_ingest_jobs: Optional[IngestJobs] = None
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global vector_stores, llm, documents, shared_ingest_jobs
+    # The model loads in the background; the first retrieval waits for it
+    embedder = Embedder(cache_path=os.path.join("rag_db", "embedding_cache.sqlite"))
+    vector_stores = SessionVectorStores(embedder, readonly=SHARED)
+    documents = (ReadOnlyVectorStore if SHARED else VectorStore)(DOCUMENTS_INDEX, embedder)
+    if SHARED:
+        shared_ingest_jobs = IngestJobs(store.path)
+    llm = AsyncLLMClient()
+    # Loading it takes seconds; the first prompt waits for it in the pool, not on the event loop
+    rag_pool.submit(load_tokenizer)
+    yield
+    await llm.aclose()
+    # An unfinished ingest resumes where it stopped when it is submitted again
+    for job in ingest_jobs.values():
+        job["ingestor"].stop()
+    rag_pool.shutdown(wait=True)
+    store_pool.shutdown(wait=True)
+    vector_stores.close_all()
+    for job in ingest_jobs.values():
+        job["thread"].join()
+    documents.close()
+    if shared_ingest_jobs is not None:
+        shared_ingest_jobs.close()
+    store.close()
+
+app = FastAPI(title="AI Chatbot API", version="1.0.0", lifespan=lifespan)
 
 # Enable CORS for frontend
 app.add_middleware(
@@ -15,11 +87,24 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],  # pagination cursor for /sessions and /memory
 )
 
-# In-memory storage
-sessions_db: Dict[str, Dict] = {}
-messages_db: Dict[str, List[Dict]] = {}
+# Session storage (SQLite by default, see storage.py / $CHAT_STORAGE)
+store = create_store(shared=SHARED)
+# One chat turn at a time per session, across workers too when there are several
+session_locks = SessionLocks(LOCK_DIR if SHARED else None)
+
+# Page sizes for the list endpoints; the next page's cursor is sent in this header
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+# Messages of a session used as chat context
+CONTEXT_MESSAGES = 20
+# Older messages of the session retrieved by RAG per request
+RAG_TOP_K = 5
+SYSTEM_PROMPT = {"role": "system", "content": "You are a helpful assistant."}
+prompt_builder = PromptBuilder()
 
 # Pydantic models
 class SessionCreate(BaseModel):
@@ -43,6 +128,16 @@ class ChatResponse(BaseModel):
     user_message: MessageResponse
     ai_message: MessageResponse
 
+class IngestRequest(BaseModel):
+    paths: List[str]
+
+class IngestJob(BaseModel):
+    id: str
+    paths: List[str]
+    status: str  # "queued" (multi-worker mode), "running", "done" or "failed"
+    progress: Dict[str, float]
+    error: Optional[str] = None
+
 # Helper functions
 def generate_session_id() -> str:
     return str(uuid.uuid4())
@@ -50,31 +145,108 @@ def generate_session_id() -> str:
 def get_current_timestamp() -> str:
     return datetime.now().isoformat()
 
-def simulate_ai_response(user_message: str, session_history: List[Dict]) -> str:
+async def run_in_rag_pool(fn, *args):
+    return await asyncio.get_running_loop().run_in_executor(rag_pool, fn, *args)
+
+async def run_in_store_pool(fn, *args):
+    return await asyncio.get_running_loop().run_in_executor(store_pool, fn, *args)
+
+def _search_session(session_id: str, query: str) -> List[Dict]:
+    with vector_stores.session(session_id) as vs:
+        return HybridRetriever(vs).search(query, top_k=RAG_TOP_K)
+
+def _search_documents(query: str) -> List[Dict]:
+    return HybridRetriever(documents).search(query, top_k=RAG_TOP_K)
+
+def _assemble_prompt(history: List[Dict], user_input: str, rag_hits: List[Dict]) -> List[Dict]:
+    with metrics.span("prompt_assembly"):
+        return prompt_builder.build([SYSTEM_PROMPT], history, user_input, rag_hits=rag_hits)
+
+def _index_exchange(session_id: str, messages: List[Dict]):
+    try:
+        with vector_stores.session(session_id) as vs:
+            vs.add_messages(messages)
+            vs.save()
+    except Exception as e:
+        print(f"❌ Failed to index messages for session {session_id}: {e}")
+
+async def build_prompt(session_id: str, user_input: str) -> List[Dict]:
+    """Recent turns from storage plus the best RAG hits from the session's own vector store and the documents."""
+    recent_messages, session_hits, document_hits = await asyncio.gather(
+        run_in_store_pool(store.recent_messages, session_id, CONTEXT_MESSAGES),
+        run_in_rag_pool(_search_session, session_id, user_input),
+        run_in_rag_pool(_search_documents, user_input))
+    history = [{"role": m["role"], "content": m["content"]} for m in recent_messages]
+    rag_hits = sorted(session_hits + document_hits, key=lambda h: h["score"], reverse=True)[:RAG_TOP_K]
+    # Hits already in the recent turns would only waste tokens
+    recent = {m["content"] for m in history}
+    rag_hits = [h for h in rag_hits if h["content"] not in recent]
+    # Token counting is CPU work (and may load the tokenizer), so it stays off the event loop
+    return await run_in_rag_pool(_assemble_prompt, history, user_input, rag_hits)
+
+def index_exchange_in_background(session_id: str, user_message: Dict, ai_message: Dict):
+    """Embeds the new exchange into the session's store without delaying the response."""
+    if SHARED:
+        # The index writer picks the exchange up from the shared database
+        return
+    messages = [{"role": m["role"], "content": m["content"]} for m in (user_message, ai_message)]
+    rag_pool.submit(_index_exchange, session_id, messages)
+
+def store_exchange(session_id: str, user_message: Dict, ai_message: Dict):
+    """Stores a user/assistant exchange and titles the session after its first one."""
+    with metrics.span("session_append"):
+        count = store.append_messages(session_id, [user_message, ai_message])
+
+    # Update session title if it's the first message
+    if count == 2:  # First exchange
+        # Generate a title from the first message
+        title_words = user_message["content"].split()[:4]
+        new_title = " ".join(title_words) + ("..." if len(user_message["content"].split()) > 4 else "")
+        store.set_title(session_id, new_title)
+
+def _run_ingest(job: Dict):
+    try:
+        job["ingestor"].run(job["paths"])
+        job["status"] = "done"
+    except Exception as e:
+        job["status"] = "failed"
+        job["error"] = str(e)
+        print(f"❌ Ingest {job['id']} failed: {e}")
+
+def ingest_job_response(job: Dict) -> IngestJob:
+    return IngestJob(**{k: v for k, v in job.items() if k not in ("ingestor", "thread")})
+
+def resolve_ingest_paths(paths: List[str]) -> List[str]:
     """
-    Simulate AI response. Later this will connect to your RAG system and LLM.
+    The real paths of the requested files / directories, relative ones
+    taken from INGEST_ROOT. Anything resolving outside it is refused, since
+    every session's /chat searches the ingested documents.
     """
-    responses = [
-        f"That's interesting! You mentioned: '{user_message}'. Tell me more about that.",
-        f"I understand you're saying '{user_message}'. How can I help you with that?",
-        f"Thanks for sharing that. Regarding '{user_message}', here's what I think...",
-        "I'm processing your message and learning from our conversation history.",
-        "Based on our chat so far, I can see you're interested in various topics. What would you like to explore next?"
-    ]
-    
-    # Simple logic based on message content
-    message_lower = user_message.lower()
-    if "hello" in message_lower or "hi" in message_lower:
-        return "Hello! I'm your AI assistant. How can I help you today?"
-    elif "summarize" in message_lower:
-        if len(session_history) > 2:
-            return f"So far we've exchanged {len(session_history)} messages. You've been asking about various topics and I've been trying to help you explore them."
-        else:
-            return "We've just started our conversation! There isn't much to summarize yet."
-    elif "fact" in message_lower:
-        return "Here's a fun fact: Octopuses have three hearts and blue blood! Two hearts pump blood to the gills, while the third pumps blood to the rest of the body."
-    else:
-        return responses[len(session_history) % len(responses)]
+    if not INGEST_ROOT:
+        raise HTTPException(status_code=403, detail="Ingesting is disabled; set INGEST_ROOT on the server")
+    root = os.path.realpath(INGEST_ROOT)
+    resolved = []
+    for path in paths:
+        full = os.path.realpath(os.path.join(root, os.path.expanduser(path)))
+        if os.path.commonpath([root, full]) != root:
+            raise HTTPException(status_code=403, detail=f"{path} is outside the ingest root")
+        resolved.append(full)
+    return resolved
+
+async def require_session(session_id: str) -> Dict:
+    session = await run_in_store_pool(store.get_session, session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Session not found")
+    return session
+
+def set_next_cursor(response: Response, cursor: Optional[str]):
+    if cursor:
+        response.headers[NEXT_CURSOR_HEADER] = cursor
+
+def sse_event(data: Dict, event: Optional[str] = None) -> str:
+    """Formats one server-sent event."""
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data, ensure_ascii=False)}\n\n"
 
 # API Endpoints
 @app.post("/sessions", response_model=SessionResponse)
@@ -89,86 +261,183 @@ async def create_session(session_data: SessionCreate):
         "created_at": timestamp
     }
     
-    sessions_db[session_id] = session
-    messages_db[session_id] = []
+    await run_in_store_pool(store.create_session, session)
     
     return SessionResponse(**session)
 
 @app.get("/sessions", response_model=List[SessionResponse])
-async def get_sessions():
-    """Get all chat sessions"""
-    sessions = list(sessions_db.values())
-    # Sort by created_at descending (newest first)
-    sessions.sort(key=lambda x: x["created_at"], reverse=True)
+async def get_sessions(response: Response,
+                       limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+                       cursor: Optional[str] = None):
+    """Get chat sessions, newest first. Pass the X-Next-Cursor header back as `cursor` for the next page."""
+    try:
+        sessions, next_cursor = await run_in_store_pool(store.list_sessions, limit, cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    set_next_cursor(response, next_cursor)
     return [SessionResponse(**session) for session in sessions]
 
 @app.get("/meta/{session_id}", response_model=SessionResponse)
 async def get_session_meta(session_id: str):
     """Get session metadata"""
-    if session_id not in sessions_db:
-        raise HTTPException(status_code=404, detail="Session not found")
-    
-    session = sessions_db[session_id]
+    session = await require_session(session_id)
     return SessionResponse(**session)
 
 @app.get("/memory/{session_id}", response_model=List[MessageResponse])
-async def get_session_memory(session_id: str):
-    """Get chat history for a session"""
-    if session_id not in sessions_db:
-        raise HTTPException(status_code=404, detail="Session not found")
-    
-    messages = messages_db.get(session_id, [])
+async def get_session_memory(session_id: str, response: Response,
+                             limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+                             cursor: Optional[str] = None):
+    """Get chat history for a session, oldest first. Paginated like /sessions."""
+    await require_session(session_id)
+    try:
+        messages, next_cursor = await run_in_store_pool(store.get_messages, session_id, limit, cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    set_next_cursor(response, next_cursor)
     return [MessageResponse(**msg) for msg in messages]
 
 @app.post("/chat", response_model=ChatResponse)
 async def chat(request: MessageRequest):
     """Send a message and get AI response"""
-    if request.session_id not in sessions_db:
-        raise HTTPException(status_code=404, detail="Session not found")
-    
-    timestamp = get_current_timestamp()
-    
-    # Create user message
-    user_message = {
-        "role": "user",
-        "content": request.message,
-        "timestamp": timestamp
-    }
-    
-    # Get session history for context
-    session_history = messages_db.get(request.session_id, [])
-    
-    # Generate AI response (this will later connect to your RAG + LLM)
-    ai_content = simulate_ai_response(request.message, session_history)
-    
-    ai_message = {
-        "role": "assistant",
-        "content": ai_content,
-        "timestamp": get_current_timestamp()
-    }
-    
-    # Store both messages
-    if request.session_id not in messages_db:
-        messages_db[request.session_id] = []
-    
-    messages_db[request.session_id].extend([user_message, ai_message])
-    
-    # Update session title if it's the first message
-    if len(messages_db[request.session_id]) == 2:  # First exchange
-        # Generate a title from the first message
-        title_words = request.message.split()[:4]
-        new_title = " ".join(title_words) + ("..." if len(request.message.split()) > 4 else "")
-        sessions_db[request.session_id]["title"] = new_title
-    
+    await require_session(request.session_id)
+
+    # Messages to one session are answered in order, each seeing the exchanges before it
+    async with session_locks.hold(request.session_id):
+        timestamp = get_current_timestamp()
+
+        # Create user message
+        user_message = {
+            "role": "user",
+            "content": request.message,
+            "timestamp": timestamp
+        }
+
+        # Recent history + RAG context, then the local LLM
+        prompt = await build_prompt(request.session_id, request.message)
+        try:
+            ai_content = await llm.chat(prompt)
+        except LLMError as e:
+            raise HTTPException(status_code=502, detail=str(e))
+
+        ai_message = {
+            "role": "assistant",
+            "content": ai_content,
+            "timestamp": get_current_timestamp()
+        }
+
+        # Store both messages
+        await run_in_store_pool(store_exchange, request.session_id, user_message, ai_message)
+        index_exchange_in_background(request.session_id, user_message, ai_message)
+
     return ChatResponse(
         user_message=MessageResponse(**user_message),
         ai_message=MessageResponse(**ai_message)
     )
 
+@app.post("/chat/stream")
+async def chat_stream(request: MessageRequest):
+    """
+    Send a message and stream the AI response as server-sent events.
+    Each token arrives as `data: {"delta": "..."}`; a final `event: done`
+    carries the stored ChatResponse, or `event: error` if the LLM failed.
+    """
+    await require_session(request.session_id)
+
+    async def events():
+        # Held while streaming (like /chat), and only once the stream is actually consumed
+        async with session_locks.hold(request.session_id):
+            user_message = {
+                "role": "user",
+                "content": request.message,
+                "timestamp": get_current_timestamp()
+            }
+            prompt = await build_prompt(request.session_id, request.message)
+
+            parts = []
+            try:
+                async for delta in llm.stream_chat(prompt):
+                    parts.append(delta)
+                    yield sse_event({"delta": delta})
+            except LLMError as e:
+                yield sse_event({"detail": str(e)}, event="error")
+                return
+
+            ai_message = {
+                "role": "assistant",
+                "content": "".join(parts).strip(),
+                "timestamp": get_current_timestamp()
+            }
+            # Persist only once the whole reply has arrived
+            await run_in_store_pool(store_exchange, request.session_id, user_message, ai_message)
+            index_exchange_in_background(request.session_id, user_message, ai_message)
+        done = ChatResponse(user_message=MessageResponse(**user_message), ai_message=MessageResponse(**ai_message))
+        yield sse_event(done.model_dump(), event="done")
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+@app.post("/ingest", response_model=IngestJob, status_code=202)
+async def start_ingest(request: IngestRequest):
+    """
+    Bulk-load text, Markdown and PDF files (or directories of them) on the
+    server into the documents store in the background; files already
+    ingested are skipped. Paths must be under the server's INGEST_ROOT
+    (relative ones are taken from it). Poll GET /ingest/{id} for progress.
+    """
+    paths = resolve_ingest_paths(request.paths)
+    if SHARED:
+        job = shared_ingest_jobs.create(generate_session_id(), paths)
+        if job is None:
+            raise HTTPException(status_code=409, detail="An ingest is already queued or running")
+        return IngestJob(**job)
+    with ingest_lock:
+        if any(job["status"] == "running" for job in ingest_jobs.values()):
+            raise HTTPException(status_code=409, detail="An ingest is already running")
+        ingestor = Ingestor(documents)
+        job = {"id": generate_session_id(), "paths": paths, "status": "running",
+               "progress": ingestor.progress, "error": None, "ingestor": ingestor}
+        job["thread"] = threading.Thread(target=_run_ingest, args=(job,), name="ingest", daemon=True)
+        ingest_jobs[job["id"]] = job
+        job["thread"].start()
+    return ingest_job_response(job)
+
+@app.get("/ingest/{job_id}", response_model=IngestJob)
+async def get_ingest(job_id: str):
+    """Progress of an ingest job: files found / skipped, documents, chunks, failures and docs/s."""
+    job = shared_ingest_jobs.get(job_id) if SHARED else ingest_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Ingest job not found")
+    return IngestJob(**job) if SHARED else ingest_job_response(job)
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Per-stage latency histograms in the Prometheus text format (of every process sharing $METRICS_DIR)."""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
 @app.get("/")
 async def root():
-    return {"message": "AI Chatbot API is running!", "sessions": len(sessions_db)}
+    return {"message": "AI Chatbot API is running!", "sessions": await run_in_store_pool(store.session_count)}
 
 if __name__ == "__main__":
+    import argparse
+    import subprocess
+    import sys
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Run the chatbot API.")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=API_WORKERS,
+                        help="worker processes; more than one also starts the index writer")
+    args = parser.parse_args()
+    if args.workers <= 1:
+        uvicorn.run(app, host=args.host, port=args.port)
+    else:
+        # Inherited by the workers uvicorn spawns, which import this module afresh
+        os.environ["API_WORKERS"] = str(args.workers)
+        os.environ.setdefault("METRICS_DIR", METRICS_DIR)
+        metrics.clear_dir(os.environ["METRICS_DIR"])
+        writer = subprocess.Popen([sys.executable, "-m", "index_writer"])
+        try:
+            uvicorn.run("api:app", host=args.host, port=args.port, workers=args.workers)
+        finally:
+            writer.terminate()
+            writer.wait()
\ No newline at end of file
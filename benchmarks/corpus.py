@@ -0,0 +1,69 @@
+# benchmarks/corpus.py
+# Deterministic synthetic chat corpora. The same size and seed always give
+# the same turns, so runs on different releases measure the same work.
+
+import random
+from datetime import date, timedelta
+
+# Messages logged per synthetic day
+TURNS_PER_DAY = 200
+START_DAY = date(2020, 1, 1)
+TOPICS = (
+    "python", "guitar", "marathon", "cooking", "travel", "budget", "garden", "chess",
+    "photography", "sleep", "spanish", "startup", "climbing", "piano", "reading", "coffee",
+)
+SYLLABLES = ("ka", "lo", "mi", "ne", "ru", "ta", "vo", "shi", "den", "par", "sol", "tri", "ben", "qua", "zor", "el")
+VOCAB_SIZE = 4000
+
+
+def parse_size(text: str) -> int:
+    """'1k' -> 1000, '100k' -> 100000, '1m' -> 1000000; plain integers pass through."""
+    text = text.strip().lower()
+    scale = {"k": 1_000, "m": 1_000_000}.get(text[-1:], 1)
+    return int(float(text.rstrip("km")) * scale)
+
+
+def _vocabulary(rng):
+    words = set()
+    while len(words) < VOCAB_SIZE:
+        words.add("".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))))
+    return sorted(words)
+
+
+def _sentence(rng, vocab, topic, low=6, high=40):
+    words = [rng.choice(vocab) for _ in range(rng.randint(low, high))]
+    # Every message mentions its topic, so retrieval has something to find
+    words.insert(rng.randrange(len(words) + 1), topic)
+    return " ".join(words)
+
+
+def day_of(turn: int) -> str:
+    return (START_DAY + timedelta(days=turn // TURNS_PER_DAY)).isoformat()
+
+
+def iter_turns(count: int, seed: int = 0):
+    """Yields `count` messages with the metadata VectorStore keeps for the global index."""
+    rng = random.Random(seed)
+    vocab = _vocabulary(rng)
+    for i in range(count):
+        day = day_of(i)
+        yield {
+            "role": "user" if i % 2 == 0 else "assistant",
+            "content": _sentence(rng, vocab, rng.choice(TOPICS)),
+            "day": day,
+            "session": day,
+            "kind": "message",
+        }
+
+
+def queries(count: int, seed: int = 1) -> list:
+    """Short user questions drawn from the same vocabulary as the corpus."""
+    rng = random.Random(seed)
+    vocab = _vocabulary(random.Random(0))
+    return [_sentence(rng, vocab, rng.choice(TOPICS), 3, 12) for _ in range(count)]
+
+
+def summaries(count: int, seed: int = 2) -> list:
+    rng = random.Random(seed)
+    vocab = _vocabulary(random.Random(0))
+    return ["\n".join(f"- {_sentence(rng, vocab, rng.choice(TOPICS), 5, 15)}" for _ in range(5)) for _ in range(count)]
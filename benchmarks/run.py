@@ -0,0 +1,343 @@
+# benchmarks/run.py
+# Offline benchmark harness. Every (suite, corpus size) pair runs in its own
+# subprocess inside a fresh temporary directory, with the stub embedder and
+# the stub LLM server from stubs.py, and the combined results are written as
+# one JSON document so releases can be compared.
+#
+#   python -m benchmarks.run                          # every suite, 1k/100k/1m turns
+#   python -m benchmarks.run --sizes 1k,100k --suites vector_store,api --out bench.json
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from benchmarks import corpus
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SUITES = ("vector_store", "save_message", "load_session", "api")
+DEFAULT_SIZES = "1k,100k,1m"
+# Messages per add_messages() call when filling the store
+ADD_BATCH = 1_000
+# Appends timed once the day file has reached the corpus size
+APPEND_SAMPLES = 500
+LOAD_REPEATS = 5
+# Messages per synthetic API session
+SESSION_TURNS = 20
+RESULTS_VERSION = 1
+
+
+def latency_stats(samples):
+    """count, mean and p50/p95/p99/max of a list of durations, in milliseconds."""
+    ordered = sorted(samples)
+    if not ordered:
+        return {"count": 0}
+
+    def pct(p):
+        return round(ordered[min(len(ordered) - 1, int(p * len(ordered)))] * 1000, 3)
+
+    return {
+        "count": len(ordered),
+        "mean_ms": round(sum(ordered) / len(ordered) * 1000, 3),
+        "p50_ms": pct(0.5),
+        "p95_ms": pct(0.95),
+        "p99_ms": pct(0.99),
+        "max_ms": round(ordered[-1] * 1000, 3),
+    }
+
+
+def timed(fn, *args, **kwargs):
+    """Returns (result, seconds)."""
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def bench_vector_store(turns, args):
+    from rag.vector_store import VectorStore
+    from rag.retriever import HybridRetriever
+    from benchmarks.stubs import StubEmbedder
+
+    embedder = StubEmbedder()
+    store = VectorStore("bench", embedder, db_dir="rag_db")
+    batch_times = []
+    batch = []
+    for msg in corpus.iter_turns(turns, seed=args.seed):
+        batch.append(msg)
+        if len(batch) == ADD_BATCH:
+            batch_times.append(timed(store.add_messages, batch)[1])
+            batch = []
+    if batch:
+        batch_times.append(timed(store.add_messages, batch)[1])
+    _, promotion = timed(store.wait_for_promotion)
+    # save() only writes once CHECKPOINT_EVERY vectors are pending; time the write itself
+    _, save = timed(store.checkpoint)
+
+    queries = corpus.queries(args.queries, seed=args.seed + 1)
+    since = corpus.day_of(max(0, turns - 30 * corpus.TURNS_PER_DAY))
+    search = [timed(store.search, q, top_k=5)[1] for q in queries]
+    filtered = [timed(store.search, q, top_k=5, since=since, roles={"user"})[1] for q in queries]
+    retriever = HybridRetriever(store)
+    hybrid = [timed(retriever.search, q, top_k=5)[1] for q in queries]
+    index_type = store.current_index_type()
+    store.close()
+
+    reopened, load = timed(VectorStore, "bench", embedder, db_dir="rag_db")
+    reopened.close()
+    return {
+        "add_messages_s": round(sum(batch_times), 3),
+        "add_messages_per_s": round(turns / sum(batch_times), 1) if batch_times else None,
+        "add_messages_batch": latency_stats(batch_times),
+        "promotion_wait_s": round(promotion, 3),
+        "index_type": index_type,
+        "recall_at_10": store.recall,
+        "save_s": round(save, 3),
+        "load_s": round(load, 3),
+        "search": latency_stats(search),
+        "search_filtered": latency_stats(filtered),
+        "hybrid_search": latency_stats(hybrid),
+        "disk_bytes": sum(os.path.getsize(os.path.join("rag_db", f)) for f in os.listdir("rag_db")),
+    }
+
+
+def _write_today(turns, seed):
+    """Writes a day file of `turns` records straight to today's journal."""
+    import memory
+    path = memory.get_today_filename()
+    with open(path, "w", encoding="utf-8") as f:
+        for msg in corpus.iter_turns(turns, seed=seed):
+            f.write(json.dumps({"role": msg["role"], "content": msg["content"]}, ensure_ascii=False) + "\n")
+    return path
+
+
+def bench_save_message(turns, args):
+    import memory
+
+    path = _write_today(turns, args.seed)
+    contents = corpus.queries(APPEND_SAMPLES + 1, seed=args.seed + 2)
+    # The first append counts the records of the existing file
+    _, first = timed(memory.save_message, "user", contents[0])
+    appends = [timed(memory.save_message, "user", text)[1] for text in contents[1:]]
+    return {
+        "day_file_bytes": os.path.getsize(path),
+        "first_append_ms": round(first * 1000, 3),
+        "append": latency_stats(appends),
+    }
+
+
+def bench_load_session(turns, args):
+    import memory
+
+    _write_today(turns, args.seed)
+    with open(os.path.join(memory.SESSIONS_DIR, "user_profile.json"), "w", encoding="utf-8") as f:
+        json.dump({"name": "Bench"}, f)
+    # One summary per synthetic day, dated back from today
+    texts = corpus.summaries(max(1, turns // corpus.TURNS_PER_DAY), seed=args.seed + 3)
+    today = datetime.now().date()
+    for i, text in enumerate(texts):
+        day = (today - timedelta(days=i)).isoformat()
+        with open(os.path.join(memory.SESSIONS_DIR, f"{day}-summary_1.json"), "w", encoding="utf-8") as f:
+            json.dump({"summary": text, "created_at": day, "context": "auto-generated"}, f)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        # First start after an upgrade imports every summary file into the catalog
+        _, catalog_import = timed(memory.get_summary_catalog)
+        loads = [timed(memory.load_session)[1] for _ in range(LOAD_REPEATS)]
+    return {
+        "summary_files": len(texts),
+        "catalog_import_s": round(catalog_import, 3),
+        "load_session": latency_stats(loads),
+    }
+
+
+async def _drive(client, make_request, requests, concurrency):
+    """Issues `requests` requests from `concurrency` workers; returns (latencies, errors, seconds)."""
+    latencies = []
+    errors = 0
+    remaining = iter(range(requests))
+
+    async def worker(state):
+        nonlocal errors
+        for _ in remaining:
+            start = time.perf_counter()
+            response = await make_request(client, state)
+            latencies.append(time.perf_counter() - start)
+            if response.status_code != 200:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker({}) for _ in range(concurrency)))
+    return latencies, errors, time.perf_counter() - start
+
+
+def _throughput(latencies, errors, seconds):
+    return {"requests_per_s": round(len(latencies) / seconds, 1), "errors": errors, "latency": latency_stats(latencies)}
+
+
+def bench_api(turns, args):
+    os.environ["CHAT_STORAGE"] = "sqlite"
+    os.environ["CHAT_DB_PATH"] = os.path.join("chat_sessions", "api.sqlite")
+    import httpx
+    import api
+    from llm_client import AsyncLLMClient
+    from rag.ingest import DOCUMENTS_INDEX
+    from rag.session_pool import SessionVectorStores
+    from rag.vector_store import VectorStore
+    from benchmarks.stubs import StubEmbedder, StubLLMServer
+
+    session_ids = []
+    batch = []
+    for i, msg in enumerate(corpus.iter_turns(turns, seed=args.seed)):
+        if i % SESSION_TURNS == 0:
+            session_id = f"bench-{i // SESSION_TURNS:08d}"
+            api.store.create_session({"id": session_id, "title": "Bench", "created_at": f"{msg['day']}T12:00:00"})
+            session_ids.append(session_id)
+        batch.append({"role": msg["role"], "content": msg["content"], "timestamp": msg["day"]})
+        if len(batch) == SESSION_TURNS:
+            api.store.append_messages(session_ids[-1], batch)
+            batch = []
+    if batch:
+        api.store.append_messages(session_ids[-1], batch)
+
+    rng = random.Random(args.seed)
+    queries = corpus.queries(args.requests, seed=args.seed + 4)
+
+    async def list_sessions(client, state):
+        # Each worker pages through the sessions, starting over at the end
+        params = {"limit": 100}
+        if state.get("cursor"):
+            params["cursor"] = state["cursor"]
+        response = await client.get("/sessions", params=params)
+        state["cursor"] = response.headers.get("X-Next-Cursor")
+        return response
+
+    async def chat(client, state):
+        body = {"session_id": rng.choice(session_ids), "message": rng.choice(queries)}
+        return await client.post("/chat", json=body)
+
+    async def run():
+        transport = httpx.ASGITransport(app=api.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            sessions = await _drive(client, list_sessions, args.requests, args.concurrency)
+            chats = await _drive(client, chat, args.requests, args.concurrency)
+        await api.llm.aclose()
+        return sessions, chats
+
+    with StubLLMServer(delay=args.llm_delay) as llm_server:
+        # Stand-ins for what api.lifespan() would set up
+        embedder = StubEmbedder()
+        api.vector_stores = SessionVectorStores(embedder)
+        api.documents = VectorStore(DOCUMENTS_INDEX, embedder)
+        api.llm = AsyncLLMClient(url=llm_server.url)
+        sessions, chats = asyncio.run(run())
+    api.rag_pool.shutdown(wait=True)
+    api.store_pool.shutdown(wait=True)
+    api.vector_stores.close_all()
+    api.documents.close()
+    api.store.close()
+    return {
+        "sessions": len(session_ids),
+        "concurrency": args.concurrency,
+        "llm_delay_s": args.llm_delay,
+        "get_sessions": _throughput(*sessions),
+        "post_chat": _throughput(*chats),
+    }
+
+
+BENCHMARKS = {
+    "vector_store": bench_vector_store,
+    "save_message": bench_save_message,
+    "load_session": bench_load_session,
+    "api": bench_api,
+}
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_one(suite, turns, args):
+    """Runs one suite on one corpus size in a subprocess and returns its result entry."""
+    with tempfile.TemporaryDirectory(prefix=f"bench-{suite}-") as workdir:
+        result_path = os.path.join(workdir, "result.json")
+        command = [sys.executable, "-m", "benchmarks.run", "--worker", suite, "--turns", str(turns),
+                   "--result", result_path, "--queries", str(args.queries), "--requests", str(args.requests),
+                   "--concurrency", str(args.concurrency), "--llm-delay", str(args.llm_delay), "--seed", str(args.seed)]
+        env = {**os.environ, "PYTHONPATH": os.pathsep.join(filter(None, [ROOT, os.environ.get("PYTHONPATH")]))}
+        start = time.perf_counter()
+        proc = subprocess.run(command, cwd=workdir, env=env, capture_output=True, text=True)
+        entry = {"suite": suite, "turns": turns, "wall_s": round(time.perf_counter() - start, 3)}
+        if proc.returncode != 0 or not os.path.exists(result_path):
+            lines = (proc.stderr or proc.stdout).strip().splitlines()
+            entry["error"] = lines[-1] if lines else f"exit code {proc.returncode}"
+            return entry
+        with open(result_path, "r", encoding="utf-8") as f:
+            entry["metrics"] = json.load(f)
+        return entry
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline benchmarks for retrieval, persistence and the API.")
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help="comma-separated corpus sizes in turns, e.g. 1k,100k,1m")
+    parser.add_argument("--suites", default=",".join(SUITES), help=f"comma-separated subset of {', '.join(SUITES)}")
+    parser.add_argument("--queries", type=int, default=200, help="search queries per vector_store run")
+    parser.add_argument("--requests", type=int, default=500, help="requests per API endpoint")
+    parser.add_argument("--concurrency", type=int, default=16, help="concurrent API clients")
+    parser.add_argument("--llm-delay", type=float, default=0.0, help="seconds the stub LLM waits before replying")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="write the JSON results here instead of stdout")
+    parser.add_argument("--worker", choices=SUITES, help=argparse.SUPPRESS)
+    parser.add_argument("--turns", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--result", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.worker:
+        metrics = BENCHMARKS[args.worker](args.turns, args)
+        with open(args.result, "w", encoding="utf-8") as f:
+            json.dump(metrics, f)
+        return
+
+    suites = [s.strip() for s in args.suites.split(",") if s.strip()]
+    unknown = set(suites) - set(SUITES)
+    if unknown:
+        parser.error(f"unknown suites: {', '.join(sorted(unknown))}")
+    sizes = [corpus.parse_size(s) for s in args.sizes.split(",") if s.strip()]
+
+    results = []
+    for suite in suites:
+        for turns in sizes:
+            print(f"⏱️ {suite} @ {turns} turns...", file=sys.stderr)
+            results.append(run_one(suite, turns, args))
+
+    report = {
+        "version": RESULTS_VERSION,
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "git_commit": _git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": {"sizes": sizes, "suites": suites, "queries": args.queries, "requests": args.requests,
+                   "concurrency": args.concurrency, "llm_delay_s": args.llm_delay, "seed": args.seed},
+        "results": results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+# benchmarks/stubs.py
+# Offline stand-ins for the two expensive dependencies: an embedder that
+# hashes words into fixed random vectors instead of running MiniLM, and a
+# local HTTP server that answers like LM Studio's chat completions API.
+
+import json
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+# Same size as MiniLM, so index and log sizes match production
+DIM = 384
+HASH_BUCKETS = 8192
+# Not ASCII-only, so clients that decode the reply wrongly show up
+STUB_REPLY = "Sure, here is what I remember about that café 😀."
+
+
+class StubEmbedder:
+    """
+    Drop-in for rag.embedder.Embedder. A text's vector is the mean of one
+    random vector per word, so texts sharing words end up close together.
+    """
+
+    model_name = "stub"
+
+    def __init__(self, dim: int = DIM, buckets: int = HASH_BUCKETS, seed: int = 0):
+        self.dim = dim
+        self.table = np.random.default_rng(seed).standard_normal((buckets, dim)).astype("float32")
+
+    def is_ready(self) -> bool:
+        return True
+
+    def embed_text(self, text: str) -> np.ndarray:
+        ids = [zlib.crc32(word.encode("utf-8")) % len(self.table) for word in text.lower().split()] or [0]
+        return self.table[ids].mean(axis=0)
+
+    def embed_texts(self, texts: list[str]) -> np.ndarray:
+        if not texts:
+            return np.zeros((0, self.dim), dtype="float32")
+        return np.stack([self.embed_text(t) for t in texts])
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        time.sleep(self.server.delay)
+        prompt_tokens = sum(len(m.get("content", "").split()) for m in payload.get("messages", []))
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": len(STUB_REPLY.split())}
+        if payload.get("stream"):
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            for word in STUB_REPLY.split(" "):
+                event = {"choices": [{"delta": {"content": word + " "}}]}
+                self.wfile.write(f"data: {json.dumps(event, ensure_ascii=False)}\n\n".encode("utf-8"))
+            self.wfile.write(f"data: {json.dumps({'choices': [], 'usage': usage})}\n\ndata: [DONE]\n\n".encode("utf-8"))
+            self.close_connection = True
+            return
+        body = json.dumps({"choices": [{"message": {"role": "assistant", "content": STUB_REPLY}}], "usage": usage},
+                          ensure_ascii=False).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubLLMServer:
+    """OpenAI-compatible /v1/chat/completions on a free local port; use as a context manager."""
+
+    def __init__(self, delay: float = 0.0):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+        self.server.daemon_threads = True
+        self.server.delay = delay
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/v1/chat/completions"
+        self._thread = threading.Thread(target=self.server.serve_forever, name="stub-llm", daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
@@ -0,0 +1,223 @@
+# index_writer.py
+# The one process that writes the API's vector stores when api.py runs with
+# several workers. Workers store exchanges in the shared SQLite database and
+# only read the vector stores (ReadOnlyVectorStore); this process tails the
+# messages table and indexes new messages into their sessions' stores, and
+# runs queued POST /ingest jobs against the documents store. Fingerprints
+# make both idempotent, so it can be restarted at any time.
+#
+# `python api.py --workers 4` starts it for you; under another process
+# manager run `python -m index_writer` next to workers started with
+# API_WORKERS set.
+
+import json
+import os
+import signal
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from rag.embedder import Embedder
+from rag.ingest import DOCUMENTS_INDEX, Ingestor
+from rag.session_pool import SESSIONS_DB_DIR, SessionVectorStores
+from rag.vector_store import VectorStore
+from session_locks import try_lock
+from storage import DEFAULT_DB_PATH, SQLiteSessionStore
+
+# Messages read from the database per indexing pass
+TAIL_BATCH = 512
+# Seconds to wait for new messages when there are none
+POLL_INTERVAL = 0.2
+# Seconds between progress updates of a running ingest job
+PROGRESS_EVERY = 1.0
+STATE_PATH = os.path.join(SESSIONS_DB_DIR, "index_writer.json")
+LOCK_PATH = os.path.join(SESSIONS_DB_DIR, "index_writer.lock")
+
+JOBS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS ingest_jobs (
+    id TEXT PRIMARY KEY,
+    paths TEXT NOT NULL,
+    status TEXT NOT NULL,
+    progress TEXT NOT NULL,
+    error TEXT,
+    created_at TEXT NOT NULL
+);
+"""
+
+
+class IngestJobs:
+    """
+    POST /ingest jobs in the shared database: the API workers queue them
+    and poll their progress, the index writer runs them one at a time.
+    """
+
+    def __init__(self, path: str = DEFAULT_DB_PATH):
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(JOBS_SCHEMA)
+        self.conn.commit()
+
+    @staticmethod
+    def _to_job(row) -> Dict:
+        return {"id": row[0], "paths": json.loads(row[1]), "status": row[2], "progress": json.loads(row[3]),
+                "error": row[4]}
+
+    def create(self, job_id: str, paths: List[str]) -> Optional[Dict]:
+        """Queues a job; returns None if another one is queued or running."""
+        with self._lock, self.conn:
+            # Takes the write lock first, so two workers can't both queue a job
+            self.conn.execute("BEGIN IMMEDIATE")
+            if self.conn.execute("SELECT 1 FROM ingest_jobs WHERE status IN ('queued', 'running')").fetchone():
+                return None
+            self.conn.execute("INSERT INTO ingest_jobs VALUES (?, ?, 'queued', '{}', NULL, ?)",
+                              (job_id, json.dumps(paths), datetime.now().isoformat()))
+        return self.get(job_id)
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        with self._lock:
+            row = self.conn.execute("SELECT * FROM ingest_jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._to_job(row) if row else None
+
+    def claim(self) -> Optional[Dict]:
+        """Marks the oldest queued job as running and returns it."""
+        with self._lock, self.conn:
+            row = self.conn.execute(
+                "SELECT * FROM ingest_jobs WHERE status = 'queued' ORDER BY created_at LIMIT 1").fetchone()
+            if row is None:
+                return None
+            self.conn.execute("UPDATE ingest_jobs SET status = 'running' WHERE id = ?", (row[0],))
+        return {**self._to_job(row), "status": "running"}
+
+    def update(self, job_id: str, status: str, progress: Dict, error: Optional[str] = None):
+        with self._lock, self.conn:
+            self.conn.execute("UPDATE ingest_jobs SET status = ?, progress = ?, error = ? WHERE id = ?",
+                              (status, json.dumps(progress), error, job_id))
+
+    def requeue_running(self):
+        """Puts jobs a stopped writer left running back in the queue (they resume where they stopped)."""
+        with self._lock, self.conn:
+            self.conn.execute("UPDATE ingest_jobs SET status = 'queued' WHERE status = 'running'")
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+
+class IndexWriter:
+    def __init__(self, store: SQLiteSessionStore, embedder: Embedder, state_path: str = STATE_PATH):
+        self.store = store
+        self.state_path = state_path
+        self.vector_stores = SessionVectorStores(embedder)
+        self.documents = VectorStore(DOCUMENTS_INDEX, embedder)
+        self.jobs = IngestJobs(store.path)
+        self.jobs.requeue_running()
+        self._stop = threading.Event()
+        self._ingest = None  # (job, Ingestor, thread)
+        self.cursor = self._load_cursor()
+
+    def _load_cursor(self) -> int:
+        if os.path.exists(self.state_path):
+            with open(self.state_path, "r", encoding="utf-8") as f:
+                return json.load(f)["cursor"]
+        # First run: messages stored before now were indexed by the single-process API
+        cursor = self.store.last_message_id()
+        self._save_cursor(cursor)
+        return cursor
+
+    def _save_cursor(self, cursor: int):
+        tmp_path = self.state_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"cursor": cursor}, f)
+        os.replace(tmp_path, self.state_path)
+
+    def stop(self):
+        self._stop.set()
+
+    def index_new_messages(self) -> int:
+        """Indexes one batch of messages stored since the last pass; returns how many were read."""
+        rows = self.store.messages_after(self.cursor, TAIL_BATCH)
+        if not rows:
+            return 0
+        by_session = {}
+        for row in rows:
+            by_session.setdefault(row["session_id"], []).append(row)
+        for session_id, session_rows in by_session.items():
+            try:
+                with self.vector_stores.session(session_id) as vs:
+                    vs.add_messages([{"role": r["role"], "content": r["content"]} for r in session_rows],
+                                    fingerprints=[f"msg:{r['id']}" for r in session_rows])
+                    vs.save()
+            except Exception as e:
+                print(f"❌ Failed to index messages for session {session_id}: {e}")
+        self.cursor = rows[-1]["id"]
+        self._save_cursor(self.cursor)
+        return len(rows)
+
+    def _run_ingest(self, job: Dict, ingestor: Ingestor):
+        try:
+            progress = ingestor.run(job["paths"])
+            # Stopped early: back in the queue, to resume next time
+            status = "queued" if self._stop.is_set() else "done"
+            self.jobs.update(job["id"], status, progress)
+        except Exception as e:
+            self.jobs.update(job["id"], "failed", ingestor.progress, str(e))
+            print(f"❌ Ingest {job['id']} failed: {e}")
+
+    def poll_ingest(self):
+        """Reports a running job's progress, or starts the next queued job."""
+        if self._ingest is not None:
+            job, ingestor, thread = self._ingest
+            if thread.is_alive():
+                self.jobs.update(job["id"], "running", ingestor.progress)
+                return
+            self._ingest = None
+        job = self.jobs.claim()
+        if job is not None:
+            ingestor = Ingestor(self.documents)
+            thread = threading.Thread(target=self._run_ingest, args=(job, ingestor), name="ingest", daemon=True)
+            self._ingest = (job, ingestor, thread)
+            thread.start()
+
+    def run(self):
+        """Indexes and ingests until stop() is called, then checkpoints every store."""
+        last_poll = 0.0
+        try:
+            while not self._stop.is_set():
+                read = self.index_new_messages()
+                if time.monotonic() - last_poll >= PROGRESS_EVERY:
+                    self.poll_ingest()
+                    last_poll = time.monotonic()
+                if read < TAIL_BATCH:
+                    self._stop.wait(POLL_INTERVAL)
+        finally:
+            if self._ingest is not None:
+                self._ingest[1].stop()
+                self._ingest[2].join()
+            self.vector_stores.close_all()
+            self.documents.close()
+            self.jobs.close()
+
+
+def main():
+    os.makedirs(SESSIONS_DB_DIR, exist_ok=True)
+    lock_fd = os.open(LOCK_PATH, os.O_RDWR | os.O_CREAT)
+    if not try_lock(lock_fd):
+        print("⚠️ Another index writer is already running.")
+        return
+    store = SQLiteSessionStore(os.environ.get("CHAT_DB_PATH", DEFAULT_DB_PATH), hot_sessions=0)
+    writer = IndexWriter(store, Embedder(cache_path=os.path.join("rag_db", "embedding_cache.sqlite")))
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(sig, lambda *_: writer.stop())
+    print("🧠 Index writer running.")
+    try:
+        writer.run()
+    finally:
+        store.close()
+        os.close(lock_fd)
+
+
+if __name__ == "__main__":
+    main()
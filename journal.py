@@ -0,0 +1,192 @@
+# journal.py
+# Append-only JSONL journal used for the daily chat session logs.
+#
+# Every record is one JSON object on its own line, so saving a message is a
+# single append instead of a read-modify-write of the whole day. A record's
+# offset is its position among the valid records of the file. A last line
+# cut short by a crash mid-write is found by reading only the end of the
+# file and dropped by repair_tail() / the next append_record(); corrupt lines
+# anywhere else are skipped by readers, and compact_journal() is the
+# explicit full rewrite that removes them. Neither shifts any offsets.
+
+import json
+import os
+import threading
+
+_lock = threading.Lock()
+# path -> (record count, file size) so appends don't rescan the file
+_counts = {}
+
+TAIL_BLOCK_SIZE = 64 * 1024
+
+
+def _parse(line):
+    line = line.strip()
+    if not line:
+        return None
+    try:
+        record = json.loads(line)
+    except json.JSONDecodeError:
+        return None
+    return record if isinstance(record, dict) else None
+
+
+def iter_records(path):
+    """Yields every valid record in the journal, streaming line by line."""
+    if not os.path.exists(path):
+        return
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            record = _parse(line)
+            if record is not None:
+                yield record
+
+
+def count_records(path):
+    """Returns the number of valid records, cached by file size."""
+    if not os.path.exists(path):
+        return 0
+    size = os.path.getsize(path)
+    cached = _counts.get(path)
+    if cached and cached[1] == size:
+        return cached[0]
+    count = sum(1 for _ in iter_records(path))
+    _counts[path] = (count, size)
+    return count
+
+
+def _repair_tail(f):
+    """
+    Makes a journal open in binary mode end with a complete line: a torn last
+    line is cut off, or given its newline if it still parses. Only the
+    end of the file is read. Returns True if the file changed.
+    """
+    size = f.seek(0, os.SEEK_END)
+    if size == 0:
+        return False
+    f.seek(size - 1)
+    if f.read(1) == b"\n":
+        return False
+    # Find where the last line starts
+    pos = size
+    tail = b""
+    while pos > 0 and b"\n" not in tail:
+        step = min(TAIL_BLOCK_SIZE, pos)
+        pos -= step
+        f.seek(pos)
+        tail = f.read(step) + tail
+    start = pos + tail.rfind(b"\n") + 1
+    if _parse(tail[start - pos:].decode("utf-8", "replace")) is not None:
+        # Already counted as a record by the readers, so keep it
+        f.seek(0, os.SEEK_END)
+        f.write(b"\n")
+    else:
+        f.truncate(start)
+    return True
+
+
+def repair_tail(path):
+    """Drops a torn last line from the journal (see _repair_tail); returns True if there was one."""
+    if not os.path.exists(path):
+        return False
+    with _lock:
+        with open(path, "r+b") as f:
+            repaired = _repair_tail(f)
+        if repaired:
+            _counts.pop(path, None)
+    return repaired
+
+
+def append_record(path, record):
+    """Appends one record and returns its offset in the journal."""
+    line = json.dumps(record, ensure_ascii=False) + "\n"
+    with _lock:
+        offset = count_records(path)
+        with open(path, "a+b") as f:
+            # A torn last line (crash mid-write) must not swallow this record
+            _repair_tail(f)
+            f.write(line.encode("utf-8"))
+            size = f.tell()
+        _counts[path] = (offset + 1, size)
+    return offset
+
+
+def tail_records(path, n):
+    """Returns the last n valid records, reading the file backwards in blocks."""
+    if n <= 0 or not os.path.exists(path):
+        return []
+    with open(path, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        pos = f.tell()
+        buffer = b""
+        records = []
+        while pos > 0 and len(records) < n:
+            step = min(TAIL_BLOCK_SIZE, pos)
+            pos -= step
+            f.seek(pos)
+            buffer = f.read(step) + buffer
+            lines = buffer.split(b"\n")
+            # The first piece may be a partial line unless we reached the start
+            buffer = lines.pop(0) if pos > 0 else b""
+            records = [r for r in (_parse(l.decode("utf-8", "replace")) for l in lines) if r is not None] + records
+            if pos == 0:
+                break
+        return records[-n:]
+
+
+def needs_compaction(path):
+    """True if the journal holds torn or corrupt lines (reads the whole file)."""
+    if not os.path.exists(path):
+        return False
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        for line in f:
+            if line.strip() and _parse(line) is None:
+                return True
+            if not line.endswith("\n"):
+                return True
+    return False
+
+
+def compact_journal(path):
+    """
+    Rewrites the journal without torn/corrupt lines, via an atomic rename.
+    Reads and parses the whole file, so it is only run on request; day to
+    day, repair_tail() and append_record() keep the end of the file clean.
+    """
+    if not needs_compaction(path):
+        return False
+    with _lock:
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as out:
+            for record in iter_records(path):
+                out.write(json.dumps(record, ensure_ascii=False) + "\n")
+            out.flush()
+            os.fsync(out.fileno())
+        os.replace(tmp_path, path)
+        _counts.pop(path, None)
+    return True
+
+
+def migrate_json_list(json_path, path):
+    """Converts a legacy JSON-array log into a journal, keeping record order."""
+    if not os.path.exists(json_path) or os.path.exists(path):
+        return False
+    with open(json_path, "r", encoding="utf-8") as f:
+        records = json.load(f)
+    with _lock:
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as out:
+            for record in records:
+                out.write(json.dumps(record, ensure_ascii=False) + "\n")
+            out.flush()
+            os.fsync(out.fileno())
+        os.replace(tmp_path, path)
+        os.replace(json_path, json_path + ".migrated")
+    return True
+
+
+if __name__ == "__main__":
+    # python journal.py chat_sessions/2026-01-01.jsonl ...  (removes corrupt lines anywhere in the files)
+    import sys
+    for journal_path in sys.argv[1:]:
+        print(f"{journal_path}: {'compacted' if compact_journal(journal_path) else 'clean'}")
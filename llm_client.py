@@ -0,0 +1,287 @@
+# llm_client.py
+# Shared HTTP clients for the local OpenAI-compatible LLM server (LM Studio).
+# One pooled keep-alive session, timeouts, bounded retries with backoff and
+# per-call latency/token metrics for the REPL, the summarizer and the API.
+# LLMClient is blocking (requests); AsyncLLMClient (httpx) is for api.py.
+
+import asyncio
+import json
+import threading
+import time
+from collections import deque
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+import metrics
+
+LLM_URL = "http://localhost:1234/v1/chat/completions"
+DEFAULT_MODEL = "mixtral-8x7b-instruct-v0.1.Q4_K_M"
+# (connect, read) seconds; a local Mixtral can take minutes on long prompts
+TIMEOUT = (5.0, 300.0)
+MAX_RETRIES = 2
+BACKOFF_FACTOR = 0.5
+POOL_SIZE = 8
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+# Number of recent calls kept for metrics
+METRICS_WINDOW = 500
+
+
+class LLMError(Exception):
+    """Raised when the LLM server can't be reached or returns an unusable response."""
+
+
+def _reply_text(data: dict) -> str:
+    try:
+        return data["choices"][0]["message"]["content"].strip()
+    except (KeyError, IndexError, TypeError, AttributeError) as e:
+        raise LLMError(f"Unexpected response format: {data}") from e
+
+
+def _parse_sse(line: str):
+    """
+    Parses one line of a streamed completion.
+    Returns (done, delta text or None, usage dict or None).
+    """
+    if not line or not line.startswith("data:"):
+        return False, None, None
+    data = line[len("data:"):].strip()
+    if data == "[DONE]":
+        return True, None, None
+    event = json.loads(data)
+    choices = event.get("choices") or []
+    delta = (choices[0].get("delta") or {}).get("content") if choices else None
+    return False, delta, event.get("usage")
+
+
+class _CallMetrics:
+    """Latency/token bookkeeping shared by both clients."""
+
+    def __init__(self):
+        self._calls = deque(maxlen=METRICS_WINDOW)
+        self._metrics_lock = threading.Lock()
+
+    def _record(self, start, ok, prompt_tokens=None, completion_tokens=None, first_token=None):
+        latency = time.perf_counter() - start
+        if first_token is not None:
+            metrics.observe("llm_first_token", first_token)
+        metrics.observe("llm_total" if ok else "llm_failed", latency)
+        with self._metrics_lock:
+            self._calls.append({
+                "latency": latency,
+                "first_token": first_token,
+                "ok": ok,
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+            })
+
+    def last_call(self):
+        with self._metrics_lock:
+            return dict(self._calls[-1]) if self._calls else None
+
+    def stats(self) -> dict:
+        """Summary of the recent calls: count, errors, latency percentiles and tokens."""
+        with self._metrics_lock:
+            calls = list(self._calls)
+        latencies = sorted(c["latency"] for c in calls if c["ok"])
+
+        def pct(p):
+            return latencies[min(len(latencies) - 1, int(p * len(latencies)))] if latencies else None
+
+        return {
+            "calls": len(calls),
+            "errors": sum(1 for c in calls if not c["ok"]),
+            "latency_p50": pct(0.5),
+            "latency_p95": pct(0.95),
+            "prompt_tokens": sum(c["prompt_tokens"] or 0 for c in calls),
+            "completion_tokens": sum(c["completion_tokens"] or 0 for c in calls),
+        }
+
+
+class LLMClient(_CallMetrics):
+    def __init__(self, url=LLM_URL, model=DEFAULT_MODEL, timeout=TIMEOUT,
+                 max_retries=MAX_RETRIES, backoff_factor=BACKOFF_FACTOR, pool_size=POOL_SIZE):
+        super().__init__()
+        self.url = url
+        self.model = model
+        self.timeout = timeout
+        self.session = requests.Session()
+        retry = Retry(
+            total=max_retries,
+            connect=max_retries,
+            # A read error or timeout may come after the model did all the work; sending it
+            # again would repeat the whole (up to TIMEOUT long) completion, so never retry those
+            read=0,
+            other=0,
+            backoff_factor=backoff_factor,
+            status_forcelist=RETRY_STATUSES,
+            # Chat completions have no side effects, so retrying a POST is safe
+            allowed_methods=frozenset({"POST"}),
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def complete(self, messages, temperature=0.6, **params) -> dict:
+        """POSTs a chat completion and returns the decoded JSON response."""
+        payload = {"model": self.model, "messages": messages, "temperature": temperature, **params}
+        start = time.perf_counter()
+        try:
+            response = self.session.post(self.url, json=payload, timeout=self.timeout)
+            response.raise_for_status()
+            data = response.json()
+        except (requests.RequestException, ValueError) as e:
+            self._record(start, ok=False)
+            raise LLMError(f"LLM request failed: {e}") from e
+        usage = data.get("usage") or {}
+        self._record(start, ok=True, prompt_tokens=usage.get("prompt_tokens"),
+                     completion_tokens=usage.get("completion_tokens"))
+        return data
+
+    def chat(self, messages, temperature=0.6, **params) -> str:
+        """Returns the assistant's reply text for a list of chat messages."""
+        return _reply_text(self.complete(messages, temperature=temperature, **params))
+
+    def stream_chat(self, messages, temperature=0.6, **params):
+        """
+        Yields the assistant's reply incrementally as text deltas, using the
+        server's `stream: true` server-sent events.
+        """
+        payload = {"model": self.model, "messages": messages, "temperature": temperature, "stream": True, **params}
+        start = time.perf_counter()
+        first_token = None
+        chunks = 0
+        usage = {}
+        try:
+            with self.session.post(self.url, json=payload, timeout=self.timeout, stream=True) as response:
+                response.raise_for_status()
+                # Raw bytes: requests would decode a text/event-stream without a charset as ISO-8859-1
+                for line in response.iter_lines():
+                    done, delta, event_usage = _parse_sse(line.decode("utf-8"))
+                    if done:
+                        break
+                    usage = event_usage or usage
+                    if delta:
+                        if first_token is None:
+                            first_token = time.perf_counter() - start
+                        chunks += 1
+                        yield delta
+        except (requests.RequestException, ValueError) as e:
+            self._record(start, ok=False, first_token=first_token)
+            raise LLMError(f"LLM stream failed: {e}") from e
+        # Servers that don't report usage while streaming send one token per chunk
+        self._record(start, ok=True, first_token=first_token, prompt_tokens=usage.get("prompt_tokens"),
+                     completion_tokens=usage.get("completion_tokens", chunks))
+
+    def close(self):
+        self.session.close()
+
+
+class AsyncLLMClient(_CallMetrics):
+    """The same client on httpx.AsyncClient, so the API never blocks its event loop."""
+
+    def __init__(self, url=LLM_URL, model=DEFAULT_MODEL, timeout=TIMEOUT,
+                 max_retries=MAX_RETRIES, backoff_factor=BACKOFF_FACTOR, pool_size=POOL_SIZE):
+        import httpx
+        super().__init__()
+        self._httpx = httpx
+        self.url = url
+        self.model = model
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        # Like LLMClient, only failures before the request reached the server are retried
+        self._retry_errors = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+        connect, read = timeout
+        self.client = httpx.AsyncClient(
+            timeout=httpx.Timeout(read, connect=connect),
+            limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+        )
+
+    async def _backoff(self, attempt):
+        await asyncio.sleep(self.backoff_factor * (2 ** attempt))
+
+    async def complete(self, messages, temperature=0.6, **params) -> dict:
+        """POSTs a chat completion and returns the decoded JSON response."""
+        payload = {"model": self.model, "messages": messages, "temperature": temperature, **params}
+        start = time.perf_counter()
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = await self.client.post(self.url, json=payload)
+                if response.status_code in RETRY_STATUSES and attempt < self.max_retries:
+                    await self._backoff(attempt)
+                    continue
+                response.raise_for_status()
+                data = response.json()
+                break
+            except self._httpx.TransportError as e:
+                if isinstance(e, self._retry_errors) and attempt < self.max_retries:
+                    await self._backoff(attempt)
+                    continue
+                self._record(start, ok=False)
+                raise LLMError(f"LLM request failed: {e}") from e
+            except (self._httpx.HTTPStatusError, ValueError) as e:
+                self._record(start, ok=False)
+                raise LLMError(f"LLM request failed: {e}") from e
+        usage = data.get("usage") or {}
+        self._record(start, ok=True, prompt_tokens=usage.get("prompt_tokens"),
+                     completion_tokens=usage.get("completion_tokens"))
+        return data
+
+    async def chat(self, messages, temperature=0.6, **params) -> str:
+        """Returns the assistant's reply text for a list of chat messages."""
+        return _reply_text(await self.complete(messages, temperature=temperature, **params))
+
+    async def stream_chat(self, messages, temperature=0.6, **params):
+        """Async generator of reply text deltas. Retries only failed connections and RETRY_STATUSES."""
+        payload = {"model": self.model, "messages": messages, "temperature": temperature, "stream": True, **params}
+        start = time.perf_counter()
+        first_token = None
+        chunks = 0
+        usage = {}
+        for attempt in range(self.max_retries + 1):
+            try:
+                async with self.client.stream("POST", self.url, json=payload) as response:
+                    if response.status_code in RETRY_STATUSES and attempt < self.max_retries:
+                        await self._backoff(attempt)
+                        continue
+                    response.raise_for_status()
+                    async for line in response.aiter_lines():
+                        done, delta, event_usage = _parse_sse(line)
+                        if done:
+                            break
+                        usage = event_usage or usage
+                        if delta:
+                            if first_token is None:
+                                first_token = time.perf_counter() - start
+                            chunks += 1
+                            yield delta
+                break
+            except self._httpx.TransportError as e:
+                if isinstance(e, self._retry_errors) and attempt < self.max_retries:
+                    await self._backoff(attempt)
+                    continue
+                self._record(start, ok=False, first_token=first_token)
+                raise LLMError(f"LLM stream failed: {e}") from e
+            except (self._httpx.HTTPStatusError, ValueError) as e:
+                self._record(start, ok=False, first_token=first_token)
+                raise LLMError(f"LLM stream failed: {e}") from e
+        self._record(start, ok=True, first_token=first_token, prompt_tokens=usage.get("prompt_tokens"),
+                     completion_tokens=usage.get("completion_tokens", chunks))
+
+    async def aclose(self):
+        await self.client.aclose()
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client() -> LLMClient:
+    """The process-wide shared client."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = LLMClient()
+        return _client
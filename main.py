@@ -1,59 +1,119 @@
 # main.py
-import requests
-from memory import load_session, save_message, get_full_session_history, summarize_and_save
-from rag.rag_engine import RAGEngine
-
-print("🤖 Personal AI Chatbot with RAG memory is running! Type 'exit' to quit.\n")
-
-# Load recent memory
-chat_history = load_session()
-
-# Load + build RAG engine
-rag = RAGEngine()
-rag.build_index()
-
-while True:
-    user_input = input("You: ")
-    if user_input.strip().lower() == "exit":
-        summarize_and_save(get_full_session_history())
-        break
-
-    # 🔍 Get relevant past context using RAG
-    rag_context = rag.get_context_for(user_input)
-
-    # 🧠 Inject RAG context as messages at the top
-    context_msgs = [
-        {"role": "system", "content": "Here are some previous messages you might want to remember:"}
-    ]
-    for msg in rag_context:
-        context_msgs.append({"role": msg["role"], "content": msg["content"]})
-
-    # 🧵 Combine context + live session history
-    full_prompt = context_msgs + chat_history + [{"role": "user", "content": user_input}]
-
-    # Send to local LLM
-    payload = {
-        "model": "mixtral-8x7b-instruct-v0.1.Q4_K_M",
-        "messages": full_prompt,
-        "temperature": 0.6
-    }
-
-    try:
-        response = requests.post("http://localhost:1234/v1/chat/completions", json=payload)
-        response.raise_for_status()
-        data = response.json()
-        bot_reply = data["choices"][0]["message"]["content"].strip()
-        print("Bot:", bot_reply)
-
-        # Save messages to memory
-        chat_history.append({"role": "user", "content": user_input})
-        chat_history.append({"role": "assistant", "content": bot_reply})
-        save_message("user", user_input)
-        save_message("assistant", bot_reply)
-
-        # Update FAISS index with new messages
-        rag.vector_store.add_messages([{"role": "user", "content": user_input}, {"role": "assistant", "content": bot_reply}])
-        rag.vector_store.save()
-
-    except Exception as e:
-        print("❌ Request failed:", e)
+import shlex
+import sys
+from contextlib import nullcontext
+import timing
+import metrics
+
+with timing.phase("import llm client (requests)"):
+    from llm_client import get_client
+with timing.phase("import memory"):
+    from memory import load_session, save_message, get_recent_summaries
+    from prompt_builder import PromptBuilder
+    from summarizer import SummaryWorker
+with timing.phase("import rag (faiss, numpy)"):
+    from rag.rag_engine import RAGEngine
+
+# `python main.py --timings` prints where startup time goes
+show_timings = "--timings" in sys.argv[1:]
+# Replies are printed token by token unless --no-stream is given
+stream_replies = "--no-stream" not in sys.argv[1:]
+# `--trace` prints how long each stage of every turn took
+show_trace = "--trace" in sys.argv[1:]
+
+
+def main():
+    print("🤖 Personal AI Chatbot with RAG memory is running! Type 'exit' to quit.\n")
+
+    # Load recent memory
+    with timing.phase("load session"):
+        pinned_memory = load_session()
+        summaries = get_recent_summaries()
+    # Live turns of this run; older ones get trimmed to fit the prompt budget
+    chat_history = []
+    prompt_builder = PromptBuilder()
+
+    # Restore the RAG index; the embedding model loads and new entries are indexed in the background
+    rag = RAGEngine()
+    rag.build_index_in_background()
+    # Summarizes the day as it goes (and finishes jobs left over from last time)
+    summarizer = SummaryWorker()
+
+    if show_timings:
+        print(timing.report("Startup timings (prompt ready)"))
+
+    first_turn = True
+    while True:
+        user_input = input("You: ")
+        if user_input.strip().lower() == "exit":
+            if not summarizer.close():
+                print("📝 Summary still in progress; it will be finished next time you start the chat.")
+            rag.close()
+            break
+
+        if user_input.startswith("/ingest "):
+            # Bulk-load notes into memory in the background (see rag/ingest.py)
+            if not rag.ingest_in_background(shlex.split(user_input)[1:]):
+                print("📚 An ingest is already running.")
+            continue
+
+        metrics.start_trace()
+        # 🔍 Get relevant past context using RAG (waits for the model on the first turn if still loading)
+        with timing.phase("first retrieval") if first_turn else nullcontext():
+            rag_context = rag.get_context_for(user_input)
+        if first_turn and show_timings:
+            print(timing.report())
+        first_turn = False
+
+        # 🧵 Combine profile, summaries, RAG context and recent turns within the token budget
+        with metrics.span("prompt_assembly"):
+            full_prompt = prompt_builder.build(pinned_memory, chat_history, user_input,
+                                               rag_hits=rag_context, summaries=summaries)
+        if show_timings:
+            print(f"🧮 Prompt tokens by section: {prompt_builder.last_usage}")
+
+        # Send to local LLM
+        try:
+            if stream_replies:
+                print("Bot: ", end="", flush=True)
+                parts = []
+                try:
+                    for delta in get_client().stream_chat(full_prompt, temperature=0.6):
+                        print(delta, end="", flush=True)
+                        parts.append(delta)
+                finally:
+                    print()
+                bot_reply = "".join(parts).strip()
+            else:
+                bot_reply = get_client().chat(full_prompt, temperature=0.6)
+                print("Bot:", bot_reply)
+            if show_timings:
+                call = get_client().last_call()
+                first_token = f"first token {call['first_token']:.2f}s, " if call.get("first_token") is not None else ""
+                print(f"⏱️ LLM: {first_token}total {call['latency']:.2f}s, "
+                      f"{call['prompt_tokens']} prompt / {call['completion_tokens']} completion tokens")
+
+            # Save messages to memory
+            chat_history.append({"role": "user", "content": user_input})
+            chat_history.append({"role": "assistant", "content": bot_reply})
+            user_offset = save_message("user", user_input)
+            assistant_offset = save_message("assistant", bot_reply)
+            summarizer.notify()
+
+            # Update FAISS index with new messages (in the background)
+            rag.index_messages([
+                (user_offset, {"role": "user", "content": user_input}),
+                (assistant_offset, {"role": "assistant", "content": bot_reply}),
+            ])
+
+        except Exception as e:
+            print("❌ Request failed:", e)
+
+        turn_spans = metrics.end_trace()
+        if show_trace:
+            print(metrics.format_trace(turn_spans))
+
+
+# Guarded: the /ingest parse workers are spawned processes that import this module
+if __name__ == "__main__":
+    main()
@@ -3,20 +3,43 @@
 
 import json
 import os
-import requests
-import glob
+import threading
 from datetime import datetime, timedelta
+import journal
+import metrics
+from summary_catalog import SummaryCatalog
 
 SESSIONS_DIR = "chat_sessions"
+SESSION_SUFFIX = ".jsonl"
 SUMMARY_SUFFIX = "-summary.json"
-LLM_URL = "http://localhost:1234/v1/chat/completions"
 
 os.makedirs(SESSIONS_DIR, exist_ok=True)
 
+_catalog = None
+_catalog_lock = threading.Lock()
+
+def get_summary_catalog():
+    """The shared catalog of summaries, opened (and on first use filled from the files) lazily."""
+    global _catalog
+    with _catalog_lock:
+        if _catalog is None:
+            _catalog = SummaryCatalog(SESSIONS_DIR)
+        return _catalog
+
 def get_today_filename():
-    """Returns today's session chat filename."""
-    today = datetime.now().strftime("%Y-%m-%d")
-    return os.path.join(SESSIONS_DIR, f"{today}.json")
+    """Returns today's session journal filename."""
+    return get_session_filename(datetime.now().strftime("%Y-%m-%d"))
+
+def get_session_filename(day):
+    """Returns the session journal filename for a YYYY-MM-DD day, migrating a legacy JSON log if present."""
+    path = os.path.join(SESSIONS_DIR, f"{day}{SESSION_SUFFIX}")
+    legacy_path = os.path.join(SESSIONS_DIR, f"{day}.json")
+    if os.path.exists(legacy_path) and not os.path.exists(path):
+        try:
+            journal.migrate_json_list(legacy_path, path)
+        except (json.JSONDecodeError, OSError) as e:
+            print(f"⚠️ Could not migrate {legacy_path}: {e}")
+    return path
 
 def get_summary_filename():
     """Returns today's summary filename."""
@@ -43,42 +66,23 @@ def load_session():
             bio = "someone who uses this assistant"
 
     # Collect recent summaries (last 4 days)
-    summary_files = []
-    for i in range(4):
-        day = (datetime.now() - timedelta(days=i)).strftime("%Y-%m-%d")
-        day_files = glob.glob(os.path.join(SESSIONS_DIR, f"{day}-summary_*.json"))
-        single_summary = os.path.join(SESSIONS_DIR, f"{day}-summary.json")
-        if os.path.exists(single_summary):
-            day_files.append(single_summary)
-        summary_files.extend(day_files)
-
-    summary_files = sorted(summary_files)
-    print("🧠 Found summaries:", summary_files)
+    recent_summaries = _recent_catalog_entries()
+    print("🧠 Found summaries:", [os.path.join(SESSIONS_DIR, s["file"]) for s in recent_summaries])
 
     memory = [
         {"role": "system", "content": "You are a helpful assistant."}
     ]
 
-    for summary_file in summary_files:
-        try:
-            with open(summary_file, "r", encoding="utf-8") as f:
-                summary_obj = json.load(f)
-                summary = summary_obj.get("summary", "")
-                if summary:
-                    print(f"🧠 Injecting summary: {summary}")
-                    memory.append({"role": "user", "content": f"My name is {name}."})
-                    memory.append({"role": "assistant", "content": f"Hello {name}! You just told me your name, and I’ll remember it for this session."})
-        except json.JSONDecodeError:
-            print(f"⚠️ Could not load summary file {summary_file}. Ignoring.")
+    for summary_obj in recent_summaries:
+        summary = summary_obj["summary"]
+        print(f"🧠 Injecting summary: {summary}")
+        memory.append({"role": "user", "content": f"My name is {name}."})
+        memory.append({"role": "assistant", "content": f"Hello {name}! You just told me your name, and I’ll remember it for this session."})
 
     # Append recent session history
-    if os.path.exists(session_file):
-        try:
-            with open(session_file, "r", encoding="utf-8") as f:
-                session_history = json.load(f)
-                memory.extend(session_history[-10:])
-        except json.JSONDecodeError:
-            print("⚠️ Could not load session file. Starting fresh.")
+    if journal.repair_tail(session_file):
+        print("🧹 Repaired session journal (dropped a torn last line).")
+    memory.extend(journal.tail_records(session_file, 10))
 
     # Append user profile as system messages
     memory.append({"role": "system", "content": f"You are talking to {name}, the user of this personal assistant. {name} is {bio}. When the user says 'me', 'I', or 'myself', assume they mean {name}."})
@@ -86,37 +90,55 @@ def load_session():
 
     return memory
 
+def _recent_catalog_entries(days=4):
+    since = (datetime.now() - timedelta(days=days - 1)).strftime("%Y-%m-%d")
+    return get_summary_catalog().between(since=since)
+
+def get_recent_summary_files(days=4):
+    """Returns the summary files of the last `days` days, oldest first."""
+    return [os.path.join(SESSIONS_DIR, s["file"]) for s in _recent_catalog_entries(days)]
+
+def get_recent_summaries(days=4):
+    """Returns the summary texts of the last `days` days, oldest first."""
+    return [s["summary"] for s in _recent_catalog_entries(days)]
+
 def get_full_session_history():
     """Loads the full chat log for today."""
-    session_file = get_today_filename()
-    if os.path.exists(session_file):
-        try:
-            with open(session_file, "r", encoding="utf-8") as f:
-                return json.load(f)
-        except json.JSONDecodeError:
-            print("⚠️ Could not read full session history.")
-    return []
+    return list(journal.iter_records(get_today_filename()))
+
+def list_session_days():
+    """Returns every YYYY-MM-DD day that has a session log, oldest first."""
+    days = set()
+    for name in os.listdir(SESSIONS_DIR):
+        stem, ext = os.path.splitext(name)
+        if ext in (SESSION_SUFFIX, ".json") and len(stem) == 10 and stem[4] == "-" and stem[7] == "-":
+            days.add(stem)
+    return sorted(days)
+
+def iter_session_history(day):
+    """Streams (offset, message) pairs from the session log of a given day."""
+    return enumerate(journal.iter_records(get_session_filename(day)))
 
 def save_message(role, content):
-    """Appends a new message to today's session file."""
+    """Appends a new message to today's session file.
+
+    Returns the message's offset within the file (or None if saving failed).
+    """
     session_file = get_today_filename()
     try:
-        messages = []
-        if os.path.exists(session_file):
-            with open(session_file, "r", encoding="utf-8") as f:
-                messages = json.load(f)
-        messages.append({"role": role, "content": content})
-        with open(session_file, "w", encoding="utf-8") as f:
-            json.dump(messages, f, ensure_ascii=False, indent=2)
+        with metrics.span("session_append"):
+            offset = journal.append_record(session_file, {"role": role, "content": content})
+        return offset
     except Exception as e:
         print(f"❌ Failed to save message: {e}")
+        return None
 
-def save_summary(summary_text):
-    """Saves a summarized memory file with timestamp and context info."""
+def save_summary(summary_text, day=None):
+    """Saves a summarized memory file with timestamp and context info (today's unless `day` is given)."""
     timestamp = datetime.now().strftime("%Y-%m-%dT%H-%M-%S")
-    base_name = datetime.now().strftime("%Y-%m-%d")
-    existing = glob.glob(os.path.join(SESSIONS_DIR, f"{base_name}-summary_*.json"))
-    index = len(existing) + 1
+    base_name = day or datetime.now().strftime("%Y-%m-%d")
+    catalog = get_summary_catalog()
+    index = catalog.allocate(base_name)
     summary_file = os.path.join(SESSIONS_DIR, f"{base_name}-summary_{index}.json")
 
     summary_data = {
@@ -128,65 +150,19 @@ def save_summary(summary_text):
     try:
         with open(summary_file, "w", encoding="utf-8") as f:
             json.dump(summary_data, f, ensure_ascii=False, indent=2)
+        catalog.record(base_name, index, summary_text.strip(), timestamp)
         print(f"📁 Summary written to {summary_file}\n\n📌 Summary Content:\n{summary_text}\n")
     except Exception as e:
+        catalog.release(base_name, index)
         print(f"❌ Failed to save summary: {e}")
 
-def summarize_and_save(messages_to_summarize):
-    """Uses the local LLM to summarize part of the chat and saves it."""
-    print("🧪 summarize_and_save() triggered...")
-
-    from datetime import datetime
-    import os
+def save_title(title):
+    """Saves the generated session title as a timestamped metadata file."""
     timestamp = datetime.now().strftime("%Y-%m-%dT%H-%M-%S")
-
-    filtered_messages = [msg for msg in messages_to_summarize if msg["role"] in ("user", "assistant")]
-
-    summarization_prompt = [
-        {"role": "system", "content": "You are an assistant memory tool. Summarize this conversation in bullet points capturing the user's key traits, interests, goals, and background."},
-        *filtered_messages,
-        {"role": "user", "content": "Please summarize the conversation so far."}
-    ]
-
-    payload = {
-        "model": "mixtral-8x7b-instruct-v0.1.Q4_K_M",
-        "messages": summarization_prompt,
-        "temperature": 0.3
-    }
-
+    title_file = os.path.join(SESSIONS_DIR, f"{timestamp}-meta.json")
     try:
-        response = requests.post(LLM_URL, json=payload)
-        response.raise_for_status()
-        data = response.json()
-        print("🧪 Full model response:")
-        print(json.dumps(data, indent=2))
-
-        if "choices" in data and len(data["choices"]) > 0:
-            summary = data["choices"][0]["message"]["content"].strip()
-            if summary:
-                save_summary(summary)
-
-                # 🏷️ Generate a short title (second call)
-                title_prompt = summarization_prompt[:-1] + [
-                    {"role": "user", "content": "Give a 3-5 word title for this chat."}
-                ]
-                title_payload = {**payload, "messages": title_prompt}
-
-                try:
-                    title_response = requests.post(LLM_URL, json=title_payload)
-                    title_response.raise_for_status()
-                    title_data = title_response.json()
-                    title = title_data["choices"][0]["message"]["content"].strip()
-
-                    # Save metadata
-                    title_file = os.path.join(SESSIONS_DIR, f"{timestamp}-meta.json")
-                    with open(title_file, "w", encoding="utf-8") as f:
-                        json.dump({"title": title, "created_at": timestamp}, f, indent=2)
-                    print(f"\n🏷️ Session Title: {title}")
-                except Exception as e:
-                    print(f"❌ Failed to save session title: {e}")
-
-        else:
-            print("❌ Unexpected response format:", data)
+        with open(title_file, "w", encoding="utf-8") as f:
+            json.dump({"title": title, "created_at": timestamp}, f, indent=2)
+        print(f"\n🏷️ Session Title: {title}")
     except Exception as e:
-        print(f"❌ Failed to summarize: {e}")
+        print(f"❌ Failed to save session title: {e}")
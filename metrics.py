@@ -0,0 +1,180 @@
+# metrics.py
+# Latency histograms for the stages of a chat turn: query embedding, vector
+# search, prompt assembly, LLM first token / total, session append and index
+# save. Every span feeds a process-wide histogram that api.py serves in
+# Prometheus text format on /metrics; between start_trace() and end_trace()
+# the spans of the current thread are also collected, so
+# `python main.py --trace` can print where one turn's time went.
+#
+# With several processes (`python api.py --workers N` plus the index writer)
+# set $METRICS_DIR: every process then also writes its histograms to a file
+# there (from a background thread, at most every FLUSH_INTERVAL seconds and
+# at exit), and render() sums the files, so whichever worker answers a
+# scrape reports the totals of all of them, FLUSH_INTERVAL behind at most.
+
+import atexit
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+METRIC_NAME = "chatbot_stage_duration_seconds"
+# Bucket upper bounds (seconds); LLM calls on a local model can take minutes
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+# Shared directory of per-process histogram files (see above); None keeps them in this process only
+METRICS_DIR = os.environ.get("METRICS_DIR")
+# Seconds between writes of this process's file there
+FLUSH_INTERVAL = 1.0
+
+_lock = threading.Lock()
+_histograms = {}  # stage -> [per-bucket counts (last one is +Inf), count, sum]
+_local = threading.local()
+_flush_lock = threading.Lock()
+_process_file = None
+_dirty = False
+_flusher = None
+
+
+def observe(stage, seconds):
+    """Records one duration for a stage (and in this thread's trace, if one is running)."""
+    global _dirty
+    with _lock:
+        hist = _histograms.get(stage)
+        if hist is None:
+            hist = _histograms[stage] = [[0] * (len(BUCKETS) + 1), 0, 0.0]
+        hist[0][bisect_left(BUCKETS, seconds)] += 1
+        hist[1] += 1
+        hist[2] += seconds
+        _dirty = True
+    if METRICS_DIR and _flusher is None:
+        _start_flusher()
+    spans = getattr(_local, "trace", None)
+    if spans is not None:
+        spans.append((stage, getattr(_local, "depth", 0), time.perf_counter() - seconds, seconds))
+
+
+@contextmanager
+def span(stage):
+    """Times the enclosed block as one observation of `stage`."""
+    depth = getattr(_local, "depth", 0)
+    _local.depth = depth + 1
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _local.depth = depth
+        observe(stage, time.perf_counter() - start)
+
+
+def start_trace():
+    """Starts collecting the spans recorded on this thread."""
+    _local.trace = []
+
+
+def end_trace():
+    """Stops collecting and returns the spans as (stage, depth, start, seconds), in start order."""
+    spans = getattr(_local, "trace", None) or []
+    _local.trace = None
+    return sorted(spans, key=lambda s: (s[2], s[1]))
+
+
+def format_trace(spans, title="Turn trace"):
+    """Returns a printable breakdown of the spans from end_trace()."""
+    lines = [f"🔎 {title}:"]
+    for stage, depth, _, seconds in spans:
+        lines.append(f"   {'  ' * depth}{stage:<{24 - 2 * depth}} {seconds * 1000:10.1f} ms")
+    return "\n".join(lines)
+
+
+def _start_flusher():
+    global _flusher
+    with _flush_lock:
+        if _flusher is not None:
+            return
+        _flusher = threading.Thread(target=_flush_loop, name="metrics-flush", daemon=True)
+        _flusher.start()
+    atexit.register(_flush)
+
+
+def _flush_loop():
+    while True:
+        time.sleep(FLUSH_INTERVAL)
+        _flush()
+
+
+def _flush():
+    """Writes this process's histograms to its file in METRICS_DIR, if they changed."""
+    global _process_file, _dirty
+    with _flush_lock:
+        with _lock:
+            if not _dirty:
+                return
+            data = json.dumps(_histograms)
+            _dirty = False
+        try:
+            if _process_file is None:
+                os.makedirs(METRICS_DIR, exist_ok=True)
+                # Not just the pid: a restarted worker may get a dead one's pid, whose counts must stay
+                _process_file = os.path.join(METRICS_DIR, f"{os.getpid()}-{time.time_ns()}.json")
+            tmp_path = _process_file + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(data)
+            os.replace(tmp_path, _process_file)
+        except OSError:
+            with _lock:
+                _dirty = True  # try again on the next tick
+
+
+def _collect():
+    """
+    stage -> [per-bucket counts, count, sum], summed over every process
+    sharing METRICS_DIR. Only the files are read, this process's included,
+    so successive scrapes of different workers never see a total go down.
+    """
+    if not METRICS_DIR:
+        with _lock:
+            return {stage: [list(h[0]), h[1], h[2]] for stage, h in _histograms.items()}
+    merged = {}
+    for name in (os.listdir(METRICS_DIR) if os.path.isdir(METRICS_DIR) else []):
+        if not name.endswith(".json"):
+            continue
+        try:
+            with open(os.path.join(METRICS_DIR, name), "r", encoding="utf-8") as f:
+                histograms = json.load(f)
+        except (OSError, ValueError):
+            continue
+        for stage, (counts, count, total) in histograms.items():
+            hist = merged.setdefault(stage, [[0] * (len(BUCKETS) + 1), 0, 0.0])
+            hist[0] = [a + b for a, b in zip(hist[0], counts)]
+            hist[1] += count
+            hist[2] += total
+    return merged
+
+
+def clear_dir(directory):
+    """Removes the histogram files of an earlier run, before its processes start."""
+    if os.path.isdir(directory):
+        for name in os.listdir(directory):
+            if name.endswith((".json", ".tmp")):
+                os.remove(os.path.join(directory, name))
+
+
+def render():
+    """All histograms in the Prometheus text exposition format."""
+    snapshot = sorted((stage, h[0], h[1], h[2]) for stage, h in _collect().items())
+    lines = [
+        f"# HELP {METRIC_NAME} Time spent in each stage of a chat turn.",
+        f"# TYPE {METRIC_NAME} histogram",
+    ]
+    for stage, counts, count, total in snapshot:
+        cumulative = 0
+        for bound, bucket in zip(BUCKETS, counts):
+            cumulative += bucket
+            lines.append(f'{METRIC_NAME}_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+        lines.append(f'{METRIC_NAME}_bucket{{stage="{stage}",le="+Inf"}} {count}')
+        lines.append(f'{METRIC_NAME}_sum{{stage="{stage}"}} {total}')
+        lines.append(f'{METRIC_NAME}_count{{stage="{stage}"}} {count}')
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,161 @@
+# prompt_builder.py
+# Assembles the prompt sent to the LLM within a fixed token budget, so the
+# per-turn prefill cost stays roughly constant however long the chat gets.
+#
+# The budget is split between pinned system/profile messages (always kept),
+# past summaries, RAG hits and recent turns. Shares a section doesn't use
+# flow to the recent turns; turns that no longer fit are dropped oldest
+# first, or folded into a note by an optional summarizer.
+
+import threading
+from functools import lru_cache
+
+# Tokens available for the prompt (leave room for the reply in the model's context)
+PROMPT_TOKEN_BUDGET = 3000
+# Maximum share of the budget for each optional section
+SUMMARY_SHARE = 0.15
+RAG_SHARE = 0.25
+# Chat templates add a few tokens of framing per message
+MESSAGE_OVERHEAD = 4
+# Tokenizer used for counting; only loaded from the local Hugging Face cache
+TOKENIZER_NAME = "mistralai/Mixtral-8x7B-Instruct-v0.1"
+# Fallback estimate when no local tokenizer is available
+CHARS_PER_TOKEN = 4
+
+_tokenizer = None
+_tokenizer_loaded = False
+_tokenizer_lock = threading.Lock()
+
+
+def _get_tokenizer():
+    """The counting tokenizer, or None to estimate; other callers wait while the first one loads it."""
+    global _tokenizer, _tokenizer_loaded
+    if not _tokenizer_loaded:
+        with _tokenizer_lock:
+            if not _tokenizer_loaded:
+                try:
+                    from transformers import AutoTokenizer
+                    _tokenizer = AutoTokenizer.from_pretrained(TOKENIZER_NAME, local_files_only=True)
+                except Exception:
+                    print(f"⚠️ Tokenizer {TOKENIZER_NAME} not available locally, estimating token counts.")
+                    _tokenizer = None
+                # Only now: a caller seeing the flag early would cache estimates in count_tokens
+                _tokenizer_loaded = True
+    return _tokenizer
+
+
+def load_tokenizer():
+    """Loads the counting tokenizer now, e.g. from a background thread at startup."""
+    _get_tokenizer()
+
+
+@lru_cache(maxsize=8192)
+def count_tokens(text: str) -> int:
+    tokenizer = _get_tokenizer()
+    if tokenizer is None:
+        return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+    return len(tokenizer.encode(text, add_special_tokens=False))
+
+
+def message_tokens(msg: dict) -> int:
+    return count_tokens(msg["content"]) + MESSAGE_OVERHEAD
+
+
+def truncate(text: str, max_tokens: int) -> str:
+    """Cuts text down to at most max_tokens tokens."""
+    if max_tokens <= 0:
+        return ""
+    if count_tokens(text) <= max_tokens:
+        return text
+    tokenizer = _get_tokenizer()
+    if tokenizer is None:
+        return text[:max(0, max_tokens - 1) * CHARS_PER_TOKEN].rstrip() + "…"
+    ids = tokenizer.encode(text, add_special_tokens=False)[:max(0, max_tokens - 1)]
+    return tokenizer.decode(ids).rstrip() + "…"
+
+
+def _take(messages, budget, newest_first=False):
+    """Keeps messages in order while they fit in budget; returns (kept, used)."""
+    ordered = list(reversed(messages)) if newest_first else list(messages)
+    kept = []
+    used = 0
+    for msg in ordered:
+        cost = message_tokens(msg)
+        if used + cost > budget:
+            if newest_first:
+                break
+            continue
+        kept.append(msg)
+        used += cost
+    if newest_first:
+        kept.reverse()
+    return kept, used
+
+
+class PromptBuilder:
+    def __init__(self, budget=PROMPT_TOKEN_BUDGET, summary_share=SUMMARY_SHARE, rag_share=RAG_SHARE,
+                 overflow_summarizer=None):
+        """
+        overflow_summarizer, if given, is called with the turns that no longer
+        fit and returns a short text that replaces them.
+        """
+        self.budget = budget
+        self.summary_share = summary_share
+        self.rag_share = rag_share
+        self.overflow_summarizer = overflow_summarizer
+        self.last_usage = {}
+
+    def build(self, system, history, user_input, rag_hits=(), summaries=()):
+        """
+        system: pinned system/profile messages, always kept.
+        history: earlier chat turns, oldest first.
+        rag_hits: retrieved memories ({"role", "content"}), best first.
+        summaries: past summary texts, oldest first.
+        Returns the list of messages to send.
+        """
+        user_msg = {"role": "user", "content": user_input}
+        used = sum(message_tokens(m) for m in system) + message_tokens(user_msg)
+        remaining = max(0, self.budget - used)
+
+        # 📝 Summaries: newest first, capped at their share
+        summary_budget = min(int(self.budget * self.summary_share), remaining)
+        summary_msgs = [{"role": "system", "content": truncate(f"Summary of an earlier conversation:\n{s}", summary_budget - MESSAGE_OVERHEAD)}
+                        for s in summaries]
+        summary_msgs, summary_used = _take(summary_msgs, summary_budget, newest_first=True)
+        remaining -= summary_used
+
+        # 🔍 RAG hits: best first, capped at their share
+        rag_msgs = []
+        rag_used = 0
+        header = {"role": "system", "content": "Here are some previous messages you might want to remember:"}
+        rag_budget = min(int(self.budget * self.rag_share), remaining) - message_tokens(header)
+        if rag_hits and rag_budget > 0:
+            # No single hit may take more than half of the RAG share
+            hits = [{"role": h["role"], "content": truncate(h["content"], rag_budget // 2)} for h in rag_hits]
+            kept, rag_used = _take(hits, rag_budget)
+            if kept:
+                rag_msgs = [header] + kept
+                rag_used += message_tokens(header)
+        remaining -= rag_used
+
+        # 🧵 Recent turns get everything that's left, newest first
+        recent, history_used = _take(history, remaining, newest_first=True)
+        overflow_msgs = []
+        if len(recent) < len(history) and self.overflow_summarizer is not None:
+            # Make room for a note standing in for the turns that were cut
+            note_budget = remaining // 5
+            recent, history_used = _take(history, remaining - note_budget, newest_first=True)
+            dropped = history[:len(history) - len(recent)]
+            note = f"Earlier in this conversation: {self.overflow_summarizer(dropped)}"
+            overflow_msgs = [{"role": "system", "content": truncate(note, note_budget - MESSAGE_OVERHEAD)}]
+            history_used += message_tokens(overflow_msgs[0])
+
+        self.last_usage = {
+            "budget": self.budget,
+            "system": used,
+            "summaries": summary_used,
+            "rag": rag_used,
+            "history": history_used,
+            "dropped_turns": len(history) - len(recent),
+        }
+        return list(system) + summary_msgs + rag_msgs + overflow_msgs + recent + [user_msg]
@@ -0,0 +1,146 @@
+# rag/ann.py
+# Builders for the approximate-nearest-neighbour index types VectorStore can
+# promote itself to, plus a recall check against the exact flat baseline.
+# Flat, HNSW and IVF indexes can hold full float32 vectors or scalar-quantized
+# float16 / int8 codes (2 or 1 bytes per dimension instead of 4).
+
+import math
+import faiss
+import numpy as np
+
+INDEX_TYPES = ("flat", "ivf", "hnsw", "ivfpq")
+CODES = ("float32", "float16", "int8")
+# Bits per dimension of each of them, as code_bits() reports them
+CODE_BITS = {"float32": 32, "float16": 16, "int8": 8}
+
+# HNSW graph degree and search breadth
+HNSW_M = 32
+HNSW_EF_SEARCH = 64
+# IVF lists probed per query
+IVF_NPROBE = 16
+# IVF-PQ: sub-quantizers (must divide the dimension) and bits per code
+PQ_M = 48
+PQ_NBITS = 8
+# FAISS wants ~39 training points per centroid
+MIN_POINTS_PER_CENTROID = 39
+
+
+def nlist_for(n: int) -> int:
+    """Number of IVF lists for n vectors (~4·sqrt(n), at least 16)."""
+    return max(16, int(4 * math.sqrt(n)))
+
+
+def min_training_size(index_type: str, n: int) -> int:
+    """Smallest number of vectors that can train index_type for an n-vector store."""
+    if index_type == "ivf":
+        return nlist_for(n) * MIN_POINTS_PER_CENTROID
+    if index_type == "ivfpq":
+        return max(nlist_for(n), 2 ** PQ_NBITS) * MIN_POINTS_PER_CENTROID
+    return 0
+
+
+def index_type_of(index) -> str:
+    """Best-effort name of a FAISS index's type."""
+    index = faiss.downcast_index(index)
+    if isinstance(index, faiss.IndexHNSW):
+        return "hnsw"
+    if isinstance(index, faiss.IndexIVFPQ):
+        return "ivfpq"
+    if isinstance(index, faiss.IndexIVF):
+        return "ivf"
+    return "flat"
+
+
+def code_bits(index) -> float:
+    """Bits the index keeps per dimension of a vector: 32 for exact ones, fewer for compressed codes."""
+    index = faiss.downcast_index(index)
+    if isinstance(index, faiss.IndexHNSW):
+        index = faiss.downcast_index(index.storage)
+    if isinstance(index, faiss.IndexIVFPQ):
+        return index.pq.M * index.pq.nbits / index.d
+    if isinstance(index, (faiss.IndexScalarQuantizer, faiss.IndexIVFScalarQuantizer)):
+        return 16 if index.sq.qtype == faiss.ScalarQuantizer.QT_fp16 else 8
+    return 32
+
+
+def _quantizer_type(codes: str):
+    return faiss.ScalarQuantizer.QT_fp16 if codes == "float16" else faiss.ScalarQuantizer.QT_8bit
+
+
+def empty(dim: int, codes: str = "float32"):
+    """
+    The index a new store starts with. int8 codes need training data, so
+    until the first promotion an int8 store keeps float16 codes.
+    """
+    if codes == "float32":
+        return faiss.IndexFlatL2(dim)
+    return faiss.IndexScalarQuantizer(dim, faiss.ScalarQuantizer.QT_fp16)
+
+
+def configure(index):
+    """Applies search-time parameters (nprobe / efSearch) to a loaded index."""
+    downcast = faiss.downcast_index(index)
+    if isinstance(downcast, faiss.IndexHNSW):
+        downcast.hnsw.efSearch = HNSW_EF_SEARCH
+    elif isinstance(downcast, faiss.IndexIVF):
+        downcast.nprobe = IVF_NPROBE
+        # Keep ids reconstructable so the index can be retrained later
+        downcast.make_direct_map()
+    return index
+
+
+def build(index_type: str, vectors: np.ndarray, codes: str = "float32"):
+    """Builds, trains and fills an index of the given type (and code size) from vectors."""
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type {index_type!r}, expected one of {INDEX_TYPES}")
+    if codes not in CODES:
+        raise ValueError(f"Unknown codes {codes!r}, expected one of {CODES}")
+    n, dim = vectors.shape
+    exact = codes == "float32"
+    if index_type == "flat":
+        index = faiss.IndexFlatL2(dim) if exact else faiss.IndexScalarQuantizer(dim, _quantizer_type(codes))
+    elif index_type == "hnsw":
+        index = faiss.IndexHNSWFlat(dim, HNSW_M) if exact else faiss.IndexHNSWSQ(dim, _quantizer_type(codes), HNSW_M)
+    elif index_type == "ivf":
+        coarse = faiss.IndexFlatL2(dim)
+        if exact:
+            index = faiss.IndexIVFFlat(coarse, dim, nlist_for(n))
+        else:
+            index = faiss.IndexIVFScalarQuantizer(coarse, dim, nlist_for(n), _quantizer_type(codes))
+    else:
+        coarse = faiss.IndexFlatL2(dim)
+        index = faiss.IndexIVFPQ(coarse, dim, nlist_for(n), PQ_M, PQ_NBITS)
+    if isinstance(index, faiss.IndexIVF):
+        # IVF indexes don't own their coarse quantizer by default; hand it over
+        coarse.this.disown()
+        index.own_fields = True
+    if not index.is_trained:
+        index.train(vectors)
+    index.add(vectors)
+    return configure(index)
+
+
+def reconstruct_all(index, start: int = 0) -> np.ndarray:
+    """Returns the stored vectors [start:] of an index (lossy for IVF-PQ)."""
+    count = index.ntotal - start
+    if count <= 0:
+        return np.zeros((0, index.d), dtype="float32")
+    return index.reconstruct_n(start, count)
+
+
+def recall_at_k(candidate, vectors: np.ndarray, k: int = 10, sample: int = 200, seed: int = 0) -> float:
+    """
+    Recall@k of candidate against an exact flat search over the same vectors,
+    using a random sample of the stored vectors as queries.
+    """
+    if len(vectors) == 0:
+        return 1.0
+    baseline = faiss.IndexFlatL2(vectors.shape[1])
+    baseline.add(vectors)
+    rng = np.random.default_rng(seed)
+    queries = vectors[rng.choice(len(vectors), size=min(sample, len(vectors)), replace=False)]
+    k = min(k, len(vectors))
+    _, exact = baseline.search(queries, k)
+    _, approx = candidate.search(queries, k)
+    hits = sum(len(set(e) & set(a)) for e, a in zip(exact, approx))
+    return hits / float(exact.size)
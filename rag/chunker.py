@@ -0,0 +1,101 @@
+# rag/chunker.py
+# Splits long message contents into overlapping windows before embedding.
+# MiniLM only reads the first ~256 word pieces of its input, so without this
+# a multi-paragraph summary or a pasted document gets one vector for its
+# opening lines and the rest is never searchable.
+#
+# Windows are measured in words (roughly 1.3 word pieces each). "sentence"
+# mode packs whole sentences / bullet lines into each window and repeats the
+# last ones at the start of the next; "token" mode cuts fixed word windows.
+# Contents that fit in one window pass through untouched; chunks of longer
+# ones carry "parent" (the message's fingerprint or content hash) and
+# "chunk" (their position) so hits can be traced back to the message.
+
+import hashlib
+import re
+from typing import Dict, Iterator, List, Optional
+
+CHUNK_MODES = ("sentence", "token")
+DEFAULT_MODE = "sentence"
+# Words per window; 160 words stay under MiniLM's 256 word-piece limit
+CHUNK_WORDS = 160
+# Words repeated from the end of one window at the start of the next
+CHUNK_OVERLAP = 32
+
+_SENTENCE_BREAK = re.compile(r"(?<=[.!?])\s+|\s*\n+\s*")
+
+
+def parent_id(msg: Dict, fingerprint: Optional[str] = None) -> str:
+    """The id chunks use to point back at their message."""
+    if fingerprint:
+        return fingerprint
+    return hashlib.sha1(f"{msg['role']}\0{msg['content']}".encode("utf-8")).hexdigest()
+
+
+class Chunker:
+    def __init__(self, mode: str = DEFAULT_MODE, max_words: int = CHUNK_WORDS, overlap: int = CHUNK_OVERLAP):
+        if mode not in CHUNK_MODES:
+            raise ValueError(f"Unknown chunk mode {mode!r}, expected one of {CHUNK_MODES}")
+        if not 0 <= overlap < max_words:
+            raise ValueError("overlap must be smaller than max_words")
+        self.mode = mode
+        self.max_words = max_words
+        self.overlap = overlap
+
+    def split(self, msg: Dict, fingerprint: Optional[str] = None) -> Iterator[Dict]:
+        """Yields the message itself if it fits in one window, else one message per chunk."""
+        if len(msg["content"].split()) <= self.max_words:
+            yield msg
+            return
+        parent = parent_id(msg, fingerprint)
+        for i, text in enumerate(self.windows(msg["content"])):
+            yield {**msg, "content": text, "parent": parent, "chunk": i}
+
+    def windows(self, text: str) -> Iterator[str]:
+        """Yields the text's windows in order."""
+        if self.mode == "token":
+            yield from self._word_windows(text.split())
+        else:
+            yield from self._sentence_windows(text)
+
+    def _word_windows(self, words: List[str]) -> Iterator[str]:
+        step = self.max_words - self.overlap
+        for start in range(0, len(words), step):
+            yield " ".join(words[start:start + self.max_words])
+            if start + self.max_words >= len(words):
+                break
+
+    def _sentence_windows(self, text: str) -> Iterator[str]:
+        window = []  # (sentence, word count)
+        size = 0
+        fresh = False  # window holds sentences not yet emitted
+        for sentence in _SENTENCE_BREAK.split(text):
+            sentence = sentence.strip()
+            if not sentence:
+                continue
+            count = len(sentence.split())
+            if count > self.max_words:
+                # A single overlong sentence falls back to word windows
+                if fresh:
+                    yield " ".join(s for s, _ in window)
+                window, size, fresh = [], 0, False
+                yield from self._word_windows(sentence.split())
+                continue
+            if fresh and size + count > self.max_words:
+                yield " ".join(s for s, _ in window)
+                # Carry the trailing sentences that fit in the overlap
+                carry = []
+                carried = 0
+                for s, n in reversed(window):
+                    if carried + n > self.overlap:
+                        break
+                    carry.insert(0, (s, n))
+                    carried += n
+                window, size = carry, carried
+                while window and size + count > self.max_words:
+                    size -= window.pop(0)[1]
+            window.append((sentence, count))
+            size += count
+            fresh = True
+        if fresh:
+            yield " ".join(s for s, _ in window)
@@ -1,22 +1,153 @@
 # rag/embedder.py
 
-from sentence_transformers import SentenceTransformer
+from concurrent.futures import Future
+from typing import Optional
 import numpy as np
 import os
+import queue
+import threading
+from .embedding_cache import LRUCache, DiskCache, text_key
+import timing
 
 class Embedder:
-    def __init__(self, model_name: str = "all-MiniLM-L6-v2"):
-        print(f"🔍 Loading embedding model: {model_name}")
-        self.model = SentenceTransformer(model_name)
+    """
+    SentenceTransformer wrapper with an embedding cache and micro-batching.
+
+    Every text is looked up in an in-memory LRU (and, if cache_path is set, a
+    persistent SQLite tier) before touching the model. Only embed_text()
+    (queries) writes to the SQLite tier; bulk indexing through embed_texts()
+    would otherwise copy the whole corpus into it. Single-query calls from
+    several threads are collected for up to batch_window seconds and
+    encoded together in one forward pass.
+
+    With background=True (the default) sentence_transformers/torch are
+    imported and the model is loaded and warmed up in a separate thread; the
+    first call that needs the model waits for it.
+    """
+
+    def __init__(self, model_name: str = "all-MiniLM-L6-v2", batch_size: int = 32,
+                 num_threads: Optional[int] = None, normalize: bool = False,
+                 cache_size: int = 4096, cache_path: Optional[str] = None,
+                 batch_window: float = 0.002, background: bool = True):
+        self.model_name = model_name
+        self.num_threads = num_threads
+        self._model = None
+        self._load_error = None
+        self._ready = threading.Event()
+        if background:
+            threading.Thread(target=self._load_model, name="embed-loader", daemon=True).start()
+        else:
+            self._load_model()
+        self.batch_size = batch_size
+        self.normalize = normalize
+        self.batch_window = batch_window
+        self.cache = LRUCache(cache_size)
+        self.disk_cache = None
+        if cache_path:
+            os.makedirs(os.path.dirname(cache_path) or ".", exist_ok=True)
+            self.disk_cache = DiskCache(cache_path)
+        self._requests = queue.Queue()
+        self._batcher = threading.Thread(target=self._batch_loop, name="embed-batcher", daemon=True)
+        self._batcher.start()
+
+    def _load_model(self):
+        try:
+            print(f"🔍 Loading embedding model: {self.model_name}")
+            with timing.phase("import sentence_transformers"):
+                from sentence_transformers import SentenceTransformer
+            if self.num_threads:
+                import torch
+                torch.set_num_threads(self.num_threads)
+            with timing.phase("load embedding model"):
+                model = SentenceTransformer(self.model_name)
+            with timing.phase("warm up embedding model"):
+                model.encode(["warm up"], convert_to_numpy=True)
+            self._model = model
+        except Exception as e:
+            self._load_error = e
+            print(f"❌ Failed to load embedding model: {e}")
+        finally:
+            self._ready.set()
+
+    def is_ready(self) -> bool:
+        return self._ready.is_set()
+
+    @property
+    def model(self):
+        """The SentenceTransformer, waiting for the background load if needed."""
+        if not self._ready.is_set():
+            with timing.phase("wait for embedding model"):
+                self._ready.wait()
+        if self._load_error is not None:
+            raise RuntimeError(f"Embedding model {self.model_name} failed to load") from self._load_error
+        return self._model
+
+    def _encode(self, texts: list[str]) -> np.ndarray:
+        return self.model.encode(texts, batch_size=self.batch_size, convert_to_numpy=True,
+                                 normalize_embeddings=self.normalize).astype("float32", copy=False)
+
+    def _batch_loop(self):
+        while True:
+            batch = [self._requests.get()]
+            # Give concurrent callers a moment to join this forward pass
+            try:
+                while len(batch) < self.batch_size:
+                    batch.append(self._requests.get(timeout=self.batch_window))
+            except queue.Empty:
+                pass
+            try:
+                vectors = self._encode([text for text, _ in batch])
+                for (_, future), vec in zip(batch, vectors):
+                    future.set_result(vec)
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
 
     def embed_text(self, text: str) -> np.ndarray:
         """
         Embed a single piece of text and return a numpy vector.
         """
-        return self.model.encode(text, convert_to_numpy=True)
+        key = text_key(self.model_name, text, self.normalize)
+        vec = self.cache.get(key)
+        if vec is not None:
+            return vec
+        if self.disk_cache is not None:
+            vec = self.disk_cache.get_many([key]).get(key)
+            if vec is not None:
+                self.cache.put(key, vec)
+                return vec
+        future = Future()
+        self._requests.put((text, future))
+        vec = future.result()
+        self.cache.put(key, vec)
+        if self.disk_cache is not None:
+            self.disk_cache.put_many({key: vec})
+        return vec
 
     def embed_texts(self, texts: list[str]) -> np.ndarray:
         """
         Embed a list of texts and return a 2D numpy array.
+        Only texts missing from the cache are encoded, in batches of batch_size.
         """
-        return self.model.encode(texts, convert_to_numpy=True)
+        keys = [text_key(self.model_name, t, self.normalize) for t in texts]
+        found = {}
+        for key in keys:
+            vec = self.cache.get(key)
+            if vec is not None:
+                found[key] = vec
+        if self.disk_cache is not None:
+            found.update(self.disk_cache.get_many(k for k in set(keys) if k not in found))
+
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in found and key not in missing:
+                missing[key] = text
+        if missing:
+            vectors = self._encode(list(missing.values()))
+            found.update(zip(missing.keys(), vectors))
+
+        for key in keys:
+            self.cache.put(key, found[key])
+        if not keys:
+            return np.zeros((0, self.model.get_sentence_embedding_dimension()), dtype="float32")
+        return np.stack([found[key] for key in keys])
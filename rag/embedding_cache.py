@@ -0,0 +1,91 @@
+# rag/embedding_cache.py
+# Two-tier cache for embeddings: an in-process LRU and an optional SQLite
+# file that survives restarts. Keys are hashes of the normalized text.
+
+import hashlib
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional
+
+import numpy as np
+
+# Rows the SQLite tier keeps (~1.5 KB each for MiniLM); the oldest written go first
+DISK_CACHE_ROWS = 50_000
+
+
+def text_key(model_name: str, text: str, normalize: bool = False) -> str:
+    """
+    Cache key for a text. MiniLM's tokenizer is uncased and ignores runs of
+    whitespace, so texts differing only in those embed identically. Unit-length
+    vectors get their own keys; the raw ones keep the keys they always had.
+    """
+    if normalize:
+        model_name = f"{model_name}:normalized"
+    normalized = " ".join(text.lower().split())
+    return hashlib.sha1(f"{model_name}\0{normalized}".encode("utf-8")).hexdigest()
+
+
+class LRUCache:
+    def __init__(self, max_size: int = 4096):
+        self.max_size = max_size
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        with self._lock:
+            vec = self._items.get(key)
+            if vec is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return vec
+
+    def put(self, key: str, vec: np.ndarray):
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._items[key] = vec
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+
+
+class DiskCache:
+    def __init__(self, path: str, max_rows: int = DISK_CACHE_ROWS):
+        self.max_rows = max_rows
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vec BLOB NOT NULL)")
+        self.conn.commit()
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, np.ndarray]:
+        keys = list(keys)
+        found = {}
+        with self._lock:
+            for i in range(0, len(keys), 900):
+                chunk = keys[i:i + 900]
+                placeholders = ",".join("?" * len(chunk))
+                for key, blob in self.conn.execute(f"SELECT key, vec FROM embeddings WHERE key IN ({placeholders})", chunk):
+                    found[key] = np.frombuffer(blob, dtype="float32")
+        return found
+
+    def put_many(self, items: Dict[str, np.ndarray]):
+        if not items:
+            return
+        with self._lock, self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO embeddings VALUES (?, ?)",
+                [(key, np.asarray(vec, dtype="float32").tobytes()) for key, vec in items.items()],
+            )
+            # REPLACE gives a rewritten key a new rowid, so rowid order is write order
+            self.conn.execute("DELETE FROM embeddings WHERE rowid <= (SELECT MAX(rowid) FROM embeddings) - ?",
+                              (self.max_rows,))
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
@@ -0,0 +1,225 @@
+# rag/ingest.py
+# Bulk-loads local notes (plain text, Markdown and PDF) into a VectorStore.
+# Files are read and chunked in a process pool, a bounded number of tasks
+# ahead of the embedder, and the chunks are streamed through add_messages()
+# so they are embedded EMBED_BATCH at a time and never all held in memory.
+#
+# Progress is checkpointed through the store's fingerprint manifest: every
+# chunk carries its own fingerprint and a file's last chunk carries the
+# file's (path, mtime, size), so an interrupted ingest resumes mid-file and
+# files that are already in the store are skipped without being parsed.
+# An edited file is ingested again; its earlier version stays searchable.
+#
+#   python -m rag.ingest ~/notes ~/papers            # into the global memory index
+#   python -m rag.ingest ~/notes --store documents --workers 8
+#
+# Don't run the CLI against a store the chat is using; inside the chat use
+# `/ingest <path>`, and through the API POST /ingest.
+
+import argparse
+import multiprocessing
+import os
+import re
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from itertools import islice, tee
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from .chunker import Chunker
+from .embedder import Embedder
+from .vector_store import GLOBAL_INDEX, VectorStore
+
+TEXT_EXTENSIONS = (".txt", ".text")
+MARKDOWN_EXTENSIONS = (".md", ".markdown")
+PDF_EXTENSIONS = (".pdf",)
+EXTENSIONS = TEXT_EXTENSIONS + MARKDOWN_EXTENSIONS + PDF_EXTENSIONS
+# Files parsed per pool task, and tasks kept in flight per worker
+FILES_PER_TASK = 16
+TASKS_PER_WORKER = 4
+# Files whose fingerprints are looked up at once when skipping finished files
+SKIP_CHECK_BATCH = 1_000
+# Seconds between progress lines
+REPORT_EVERY = 10.0
+# Store the API ingests into (the CLI chat ingests into its global memory)
+DOCUMENTS_INDEX = "documents"
+
+_FRONT_MATTER = re.compile(r"\A---\n.*?\n---\n", re.S)
+_MD_LINK = re.compile(r"!?\[([^\]]*)\]\([^)]*\)")
+_MD_MARKUP = re.compile(r"^\s{0,3}(#{1,6}|>|[-*+]|\d+\.)\s+|[*`]{1,3}", re.M)
+
+
+def file_fingerprint(path: str, stat: os.stat_result) -> str:
+    return f"doc:{path}:{stat.st_mtime_ns}:{stat.st_size}"
+
+
+def find_files(paths: Iterable[str]) -> Iterator[str]:
+    """Absolute paths of the supported files under the given files / directories, skipping hidden ones."""
+    for path in paths:
+        path = os.path.abspath(os.path.expanduser(path))
+        if os.path.isfile(path):
+            if path.lower().endswith(EXTENSIONS):
+                yield path
+            continue
+        for directory, dirs, files in os.walk(path):
+            dirs[:] = sorted(d for d in dirs if not d.startswith("."))
+            for file in sorted(files):
+                if not file.startswith(".") and file.lower().endswith(EXTENSIONS):
+                    yield os.path.join(directory, file)
+
+
+def read_text(path: str) -> str:
+    """The plain text of a supported file."""
+    lower = path.lower()
+    if lower.endswith(PDF_EXTENSIONS):
+        try:
+            from pypdf import PdfReader
+        except ImportError:
+            raise RuntimeError("PDF support needs pypdf (pip install pypdf)")
+        return "\n".join(page.extract_text() or "" for page in PdfReader(path).pages)
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        text = f.read()
+    if lower.endswith(MARKDOWN_EXTENSIONS):
+        text = _MD_MARKUP.sub("", _MD_LINK.sub(r"\1", _FRONT_MATTER.sub("", text)))
+    return text
+
+
+def parse_files(paths: List[str], chunker: Chunker) -> List[Dict]:
+    """
+    Runs in the pool: reads and chunks each file. Returns one result per
+    file with its "path" and either "chunks" ((message, fingerprint)
+    pairs) or an "error".
+    """
+    results = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+            text = read_text(path).strip()
+        except Exception as e:
+            results.append({"path": path, "error": str(e)})
+            continue
+        fp = file_fingerprint(path, stat)
+        doc = {"role": "system", "content": text, "kind": "document", "source": path,
+               "day": datetime.fromtimestamp(stat.st_mtime).strftime("%Y-%m-%d")}
+        chunks = list(chunker.split(doc, fp)) if text else []
+        # The file's own fingerprint goes with its last chunk, marking the file done
+        fingerprints = [f"{fp}#{i}" for i in range(len(chunks) - 1)] + [fp] * bool(chunks)
+        results.append({"path": path, "chunks": list(zip(chunks, fingerprints))})
+    return results
+
+
+class Ingestor:
+    """
+    Ingests files into a store. progress holds the running counts: files
+    found, skipped (already ingested), documents parsed, chunks, failed,
+    seconds and documents per second.
+    """
+
+    def __init__(self, store: VectorStore, workers: Optional[int] = None, report_every: float = REPORT_EVERY):
+        self.store = store
+        self.workers = workers or max(1, (os.cpu_count() or 2) - 1)
+        self.report_every = report_every
+        self.progress = {"files": 0, "skipped": 0, "documents": 0, "chunks": 0, "failed": 0,
+                         "seconds": 0.0, "docs_per_sec": 0.0}
+        self._stop = threading.Event()
+        self._start = None
+        self._last_report = 0.0
+
+    def stop(self):
+        """Asks a running ingest to stop after the current batch; the next run resumes it."""
+        self._stop.set()
+
+    def _tick(self, force: bool = False):
+        now = time.monotonic()
+        seconds = now - self._start
+        self.progress["seconds"] = round(seconds, 1)
+        self.progress["docs_per_sec"] = round(self.progress["documents"] / seconds, 1) if seconds else 0.0
+        if force or now - self._last_report >= self.report_every:
+            self._last_report = now
+            p = self.progress
+            print(f"📚 Ingested {p['documents']} documents ({p['chunks']} chunks, {p['skipped']} unchanged, "
+                  f"{p['failed']} failed) in {p['seconds']}s, {p['docs_per_sec']} docs/s")
+
+    def _pending_files(self, paths: Iterable[str]) -> Iterator[str]:
+        """The files not yet fully in the store."""
+        files = find_files(paths)
+        while batch := list(islice(files, SKIP_CHECK_BATCH)):
+            fps = {}
+            for path in batch:
+                try:
+                    fps[path] = file_fingerprint(path, os.stat(path))
+                except OSError:
+                    fps[path] = None
+            done = self.store.meta.known_fingerprints(fps.values())
+            self.progress["files"] += len(batch)
+            for path in batch:
+                if fps[path] in done:
+                    self.progress["skipped"] += 1
+                else:
+                    yield path
+
+    def _parsed(self, paths: Iterable[str]) -> Iterator[Dict]:
+        """Parse results in file order, at most workers * TASKS_PER_WORKER tasks ahead of the consumer."""
+        files = iter(paths)
+        context = multiprocessing.get_context("spawn")  # forking a process with model threads is unsafe
+        with ProcessPoolExecutor(self.workers, mp_context=context) as pool:
+            pending = deque()
+            while True:
+                while len(pending) < self.workers * TASKS_PER_WORKER and not self._stop.is_set():
+                    group = list(islice(files, FILES_PER_TASK))
+                    if not group:
+                        break
+                    pending.append(pool.submit(parse_files, group, self.store.chunker))
+                if not pending:
+                    return
+                yield from pending.popleft().result()
+                if self._stop.is_set():
+                    for future in pending:
+                        future.cancel()
+                    return
+
+    def _chunks(self, paths: Iterable[str]) -> Iterator[tuple]:
+        for result in self._parsed(self._pending_files(paths)):
+            if "error" in result:
+                self.progress["failed"] += 1
+                print(f"⚠️ Skipped {result['path']}: {result['error']}")
+            else:
+                self.progress["documents"] += 1
+                self.progress["chunks"] += len(result["chunks"])
+                yield from result["chunks"]
+            self._tick()
+
+    def run(self, paths: Iterable[str]) -> Dict:
+        """Ingests every supported file under paths; returns the final progress."""
+        self._start = self._last_report = time.monotonic()
+        self._stop.clear()
+        messages, fingerprints = tee(self._chunks(paths))
+        try:
+            self.store.add_messages((m for m, _ in messages), fingerprints=(fp for _, fp in fingerprints))
+        finally:
+            self.store.checkpoint()
+            self._tick(force=True)
+        return dict(self.progress)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk-load text, Markdown and PDF files into a vector store.")
+    parser.add_argument("paths", nargs="+", help="files or directories to ingest")
+    parser.add_argument("--store", default=GLOBAL_INDEX, help="store name (default: the chat's global memory)")
+    parser.add_argument("--db-dir", default="rag_db")
+    parser.add_argument("--workers", type=int, help="parsing processes (default: CPUs - 1)")
+    args = parser.parse_args(argv)
+
+    store = VectorStore(args.store, Embedder(background=False), db_dir=args.db_dir)
+    try:
+        Ingestor(store, workers=args.workers).run(args.paths)
+    except KeyboardInterrupt:
+        print("⏸️ Interrupted; run the same command again to resume.")
+    finally:
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
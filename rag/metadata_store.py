@@ -0,0 +1,218 @@
+# rag/metadata_store.py
+# SQLite-backed metadata for VectorStore: one row per FAISS vector, keyed by
+# the FAISS row id, so search() can fetch just the hits it returned and an
+# append writes only the new rows. An FTS5 index over the contents, kept in
+# step with the rows, gives the hybrid retriever its BM25 candidates.
+
+import json
+import os
+import re
+import sqlite3
+import threading
+from urllib.request import pathname2url
+from typing import Dict, Iterable, List, Optional
+
+# Columns kept as real SQL columns (filterable); anything else goes in "extra"
+COLUMNS = ("role", "content", "day", "session", "kind")
+# Stay well under SQLite's limit on bound parameters per statement
+MAX_PARAMS = 900
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS rows (
+    id INTEGER PRIMARY KEY,
+    role TEXT NOT NULL,
+    content TEXT NOT NULL,
+    day TEXT,
+    session TEXT,
+    kind TEXT,
+    extra TEXT
+);
+CREATE INDEX IF NOT EXISTS rows_day ON rows(day);
+CREATE INDEX IF NOT EXISTS rows_kind ON rows(kind);
+CREATE TABLE IF NOT EXISTS fingerprints (fp TEXT PRIMARY KEY);
+CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value TEXT);
+"""
+# BM25 index over rows.content; rowid is the row id
+FTS_SCHEMA = "CREATE VIRTUAL TABLE IF NOT EXISTS rows_fts USING fts5(content, content='rows', content_rowid='id')"
+# Terms of a query passed to FTS5 (longer queries keep their first terms)
+MAX_QUERY_TERMS = 32
+
+
+def _to_row(row_id: int, meta: Dict) -> tuple:
+    extra = {k: v for k, v in meta.items() if k not in COLUMNS}
+    return (row_id, *(meta.get(c) for c in COLUMNS), json.dumps(extra, ensure_ascii=False) if extra else None)
+
+
+def _chunks(items: List, size: int = MAX_PARAMS):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def _filter_clauses(since=None, until=None, roles=None, kinds=None, sessions=None, table="rows"):
+    """SQL conditions (and their parameters) for the search filters."""
+    clauses = []
+    params = []
+    if since is not None:
+        clauses.append(f"{table}.day >= ?")
+        params.append(since)
+    if until is not None:
+        clauses.append(f"{table}.day <= ?")
+        params.append(until)
+    for column, allowed in (("role", roles), ("kind", kinds), ("session", sessions)):
+        if allowed is not None:
+            allowed = list(allowed)
+            clauses.append(f"{table}.{column} IN ({','.join('?' * len(allowed))})")
+            params.extend(allowed)
+    return clauses, params
+
+
+def _from_row(row: tuple) -> Dict:
+    meta = {c: v for c, v in zip(COLUMNS, row[1:6]) if v is not None}
+    if row[6]:
+        meta.update(json.loads(row[6]))
+    return meta
+
+
+class MetadataStore:
+    def __init__(self, path: str, readonly: bool = False):
+        self.path = path
+        self._lock = threading.RLock()
+        if readonly:
+            # A reader next to the process that writes the store (see ReadOnlyVectorStore)
+            uri = f"file:{pathname2url(os.path.abspath(path))}?mode=ro"
+            self.conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+            self.fts = self.conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'rows_fts'").fetchone() is not None
+            return
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self.conn.commit()
+        try:
+            self.conn.execute(FTS_SCHEMA)
+            self.fts = True
+        except sqlite3.OperationalError:
+            print("⚠️ SQLite was built without FTS5, lexical search disabled.")
+            self.fts = False
+        self._backfill_fts()
+
+    def _backfill_fts(self):
+        """Indexes rows added before the FTS table existed."""
+        if not self.fts:
+            return
+        with self._lock, self.conn:
+            indexed = self.get_state("fts_rows", 0)
+            count = self.count()
+            if indexed < count:
+                self.conn.execute("INSERT INTO rows_fts(rowid, content) SELECT id, content FROM rows WHERE id >= ?", (indexed,))
+                self._put_state(fts_rows=count)
+
+    def count(self) -> int:
+        with self._lock:
+            return self.conn.execute("SELECT COUNT(*) FROM rows").fetchone()[0]
+
+    def append(self, start_id: int, metas: List[Dict], fingerprints: Iterable[Optional[str]] = ()):
+        """Inserts metas as rows start_id, start_id+1, ... and records their fingerprints."""
+        with self._lock, self.conn:
+            self.conn.executemany(
+                "INSERT INTO rows VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [_to_row(start_id + i, meta) for i, meta in enumerate(metas)],
+            )
+            if self.fts:
+                self.conn.executemany(
+                    "INSERT INTO rows_fts(rowid, content) VALUES (?, ?)",
+                    [(start_id + i, meta["content"]) for i, meta in enumerate(metas)],
+                )
+                self._put_state(fts_rows=start_id + len(metas))
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO fingerprints VALUES (?)",
+                [(fp,) for fp in fingerprints if fp is not None],
+            )
+
+    def get(self, ids: Iterable[int]) -> Dict[int, Dict]:
+        """Returns {row id: metadata} for the given ids."""
+        ids = [int(i) for i in ids]
+        found = {}
+        with self._lock:
+            for chunk in _chunks(ids):
+                placeholders = ",".join("?" * len(chunk))
+                for row in self.conn.execute(f"SELECT * FROM rows WHERE id IN ({placeholders})", chunk):
+                    found[row[0]] = _from_row(row)
+        return found
+
+    def filter_ids(self, ids: Iterable[int], since=None, until=None, roles=None, kinds=None, sessions=None) -> set:
+        """Returns the subset of ids whose rows pass the given filters."""
+        clauses, params = _filter_clauses(since, until, roles, kinds, sessions)
+        ids = [int(i) for i in ids]
+        matched = set()
+        with self._lock:
+            for chunk in _chunks(ids, MAX_PARAMS - len(params)):
+                where = " AND ".join([f"id IN ({','.join('?' * len(chunk))})", *clauses])
+                matched.update(row[0] for row in self.conn.execute(f"SELECT id FROM rows WHERE {where}", chunk + params))
+        return matched
+
+    def lexical_search(self, query: str, limit: int, since=None, until=None, roles=None, kinds=None,
+                       sessions=None) -> List[tuple]:
+        """
+        BM25 search over the contents: (row id, score) pairs, best first,
+        where a higher score is a better match. Rows must contain at least
+        one of the query's terms and pass the given filters.
+        """
+        terms = list(dict.fromkeys(re.findall(r"\w+", query.lower())))[:MAX_QUERY_TERMS]
+        if not self.fts or not terms:
+            return []
+        match = " OR ".join(f'"{t}"' for t in terms)
+        clauses, params = _filter_clauses(since, until, roles, kinds, sessions)
+        where = " AND ".join(["rows_fts MATCH ?", *clauses])
+        with self._lock:
+            rows = self.conn.execute(
+                f"SELECT rows.id, bm25(rows_fts) FROM rows_fts JOIN rows ON rows.id = rows_fts.rowid "
+                f"WHERE {where} ORDER BY bm25(rows_fts) LIMIT ?",
+                [match, *params, limit],
+            ).fetchall()
+        # FTS5's bm25() is lower-is-better
+        return [(row[0], -row[1]) for row in rows]
+
+    def has_fingerprint(self, fp: str) -> bool:
+        with self._lock:
+            return self.conn.execute("SELECT 1 FROM fingerprints WHERE fp = ?", (fp,)).fetchone() is not None
+
+    def known_fingerprints(self, fps: Iterable[Optional[str]]) -> set:
+        """Returns the subset of fps already recorded."""
+        fps = [fp for fp in fps if fp is not None]
+        known = set()
+        with self._lock:
+            for chunk in _chunks(fps):
+                placeholders = ",".join("?" * len(chunk))
+                known.update(row[0] for row in self.conn.execute(f"SELECT fp FROM fingerprints WHERE fp IN ({placeholders})", chunk))
+        return known
+
+    def truncate(self, count: int):
+        """Drops rows with id >= count (used to repair a crash between the vector log and the rows)."""
+        with self._lock, self.conn:
+            if self.fts:
+                # External-content FTS rows are removed by replaying their old values
+                self.conn.execute("INSERT INTO rows_fts(rows_fts, rowid, content) "
+                                  "SELECT 'delete', id, content FROM rows WHERE id >= ? AND id < ?",
+                                  (count, self.get_state("fts_rows", 0)))
+                self._put_state(fts_rows=min(count, self.get_state("fts_rows", 0)))
+            self.conn.execute("DELETE FROM rows WHERE id >= ?", (count,))
+
+    def get_state(self, key: str, default=None):
+        with self._lock:
+            row = self.conn.execute("SELECT value FROM state WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def _put_state(self, **values):
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO state VALUES (?, ?)",
+            [(k, json.dumps(v)) for k, v in values.items()],
+        )
+
+    def set_state(self, **values):
+        with self._lock, self.conn:
+            self._put_state(**values)
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
@@ -0,0 +1,86 @@
+# rag/migrate.py
+# Converts existing vector stores to another vector precision, e.g. the
+# float32 stores written by earlier versions to int8 (about a quarter of the
+# size). Stores are found by their .index / .vectors files (and pre-SQLite
+# _meta.json files, which are migrated to SQLite on the way); session stores
+# under rag_db/sessions are included. Stores written before the fingerprint
+# manifest (the old per-day YYYY-MM-DD.index files) are skipped: loading one
+# discards it, and the chat re-indexes their messages from chat_sessions/.
+#
+#   python -m rag.migrate --precision int8                # every store under rag_db
+#   python -m rag.migrate --precision float16 --db-dir rag_db global
+#   python -m rag.migrate --precision float32 --no-normalize
+
+import argparse
+import os
+
+from .vector_store import PRECISIONS, VectorStore
+
+STORE_SUFFIXES = (".index", ".vectors", "_meta.json")
+
+
+def find_stores(db_dir: str, names=None):
+    """(directory, store name) of every store under db_dir, optionally only the given names."""
+    stores = set()
+    for directory, _, files in os.walk(db_dir):
+        for file in files:
+            for suffix in STORE_SUFFIXES:
+                if file.endswith(suffix):
+                    stores.add((directory, file[:-len(suffix)]))
+    return sorted(s for s in stores if not names or s[1] in names)
+
+
+def is_convertible(directory: str, name: str) -> bool:
+    """Whether VectorStore loads the store with its vectors: it has SQLite metadata or a fingerprint manifest."""
+    def exists(suffix):
+        return os.path.exists(os.path.join(directory, name + suffix))
+    return exists(".sqlite") or all(exists(suffix) for suffix in (".index", "_meta.json", "_manifest.json"))
+
+
+def store_bytes(directory: str, name: str) -> int:
+    paths = [os.path.join(directory, name + suffix) for suffix in (".index", ".vectors", ".sqlite")]
+    return sum(os.path.getsize(p) for p in paths if os.path.exists(p))
+
+
+def migrate(directory: str, name: str, precision: str, normalize=None) -> tuple:
+    """Converts one store; returns its size in bytes before and after."""
+    before = store_bytes(directory, name)
+    # Loading and converting never embed anything, so no model is needed
+    store = VectorStore(name, embedder=None, db_dir=directory, index_type="flat")
+    try:
+        store.convert(precision, normalize)
+    finally:
+        store.close()
+    return before, store_bytes(directory, name)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Convert vector stores to another vector precision.")
+    parser.add_argument("names", nargs="*", help="stores to convert (default: every store found)")
+    parser.add_argument("--precision", choices=PRECISIONS, required=True)
+    parser.add_argument("--normalize", action=argparse.BooleanOptionalAction, default=None,
+                        help="scale vectors to unit length (default: on unless --precision float32)")
+    parser.add_argument("--db-dir", default="rag_db")
+    args = parser.parse_args(argv)
+
+    stores = find_stores(args.db_dir, set(args.names))
+    if not stores:
+        print(f"⚠️ No vector stores found in {args.db_dir}")
+        return
+    total_before = total_after = converted = 0
+    for directory, name in stores:
+        if not is_convertible(directory, name):
+            print(f"⏭️ {os.path.join(directory, name)}: written before fingerprint manifests, skipped "
+                  f"(the chat re-indexes these messages from chat_sessions/)")
+            continue
+        before, after = migrate(directory, name, args.precision, args.normalize)
+        total_before += before
+        total_after += after
+        converted += 1
+        print(f"✅ {os.path.join(directory, name)}: {before / 1e6:.1f} MB -> {after / 1e6:.1f} MB")
+    print(f"🧠 Converted {converted} of {len(stores)} store(s) to {args.precision}: "
+          f"{total_before / 1e6:.1f} MB -> {total_after / 1e6:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+# rag/persistence.py
+# Write-behind worker that takes indexing and index checkpoints off the
+# interactive path. Callers submit freshly saved messages and return
+# immediately; the worker coalesces everything queued into one
+# add_messages() call (one embedding pass) and rewrites the FAISS checkpoint
+# once enough vectors are pending or enough time has passed.
+
+import atexit
+import threading
+import time
+from typing import Dict, List, Optional
+
+from .vector_store import VectorStore, CHECKPOINT_EVERY
+
+# Checkpoint at least this often (seconds) while there are unsaved vectors
+MAX_DELAY = 60.0
+
+
+class PersistenceWorker:
+    def __init__(self, store: VectorStore, max_pending: int = CHECKPOINT_EVERY, max_delay: float = MAX_DELAY):
+        self.store = store
+        self.max_pending = max_pending
+        self.max_delay = max_delay
+        self._queue = []  # (messages, fingerprints) batches
+        self._pending = 0  # vectors added since the last checkpoint
+        self._busy = False
+        self._closed = False
+        self._last_checkpoint = time.monotonic()
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name=f"persist-{store.name}", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def submit(self, messages: List[Dict], fingerprints: Optional[List[str]] = None):
+        """Queues messages to be embedded and indexed in the background."""
+        if not messages:
+            return
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("PersistenceWorker is closed")
+            self._queue.append((messages, fingerprints or [None] * len(messages)))
+            self._cond.notify()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._queue and not self._closed and not self._checkpoint_due():
+                    timeout = self.max_delay - (time.monotonic() - self._last_checkpoint) if self._pending else None
+                    self._cond.wait(timeout)
+                batches, self._queue = self._queue, []
+                closed = self._closed
+                self._busy = True
+            try:
+                if batches:
+                    messages = [m for msgs, _ in batches for m in msgs]
+                    fingerprints = [fp for _, fps in batches for fp in fps]
+                    self._pending += self.store.add_messages(messages, fingerprints=fingerprints)
+                if self._pending and (closed or self._checkpoint_due()):
+                    self.store.checkpoint()
+                    self._pending = 0
+                    self._last_checkpoint = time.monotonic()
+            except Exception as e:
+                print(f"❌ Background indexing failed: {e}")
+            with self._cond:
+                self._busy = False
+                self._cond.notify_all()
+                if closed and not self._queue:
+                    return
+
+    def _checkpoint_due(self) -> bool:
+        if not self._pending:
+            return False
+        return self._pending >= self.max_pending or time.monotonic() - self._last_checkpoint >= self.max_delay
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Waits until everything submitted so far has been indexed. Returns False on timeout."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while self._queue or self._busy:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def close(self):
+        """Indexes whatever is queued, writes a final checkpoint and stops the worker."""
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join()
+        atexit.unregister(self.close)
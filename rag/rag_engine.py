@@ -1,48 +1,145 @@
 # rag/rag_engine.py
-import json
+import hashlib
+import threading
+import timing
+import metrics
+from datetime import datetime, timedelta
 from rag.embedder import Embedder
-from rag.vector_store import VectorStore
-from memory import get_full_session_history
+from rag.vector_store import VectorStore, GLOBAL_INDEX
+from rag.persistence import PersistenceWorker
+from rag.ingest import Ingestor
+from rag.retriever import HybridRetriever
+from memory import list_session_days, iter_session_history, get_summary_catalog
 import os
 
+def fingerprint(source: str, offset: int, msg: dict) -> str:
+    """Stable id for a message: where it came from plus a hash of what it says."""
+    content_hash = hashlib.sha1(f"{msg['role']}\0{msg['content']}".encode("utf-8")).hexdigest()
+    return f"{source}:{offset}:{content_hash}"
+
 class RAGEngine:
-    def __init__(self, session_id=None):
-        from datetime import datetime
+    def __init__(self, session_id=None, index_name=GLOBAL_INDEX):
         self.session_id = session_id or datetime.now().strftime("%Y-%m-%d")
-        self.embedder = Embedder()
-        self.vector_store = VectorStore(session_id=self.session_id, embedder=self.embedder)
+        # The model loads in the background; restoring the index doesn't need it
+        self.embedder = Embedder(cache_path=os.path.join("rag_db", "embedding_cache.sqlite"))
+        # One long-lived index across all days; day/session live in the metadata
+        with timing.phase("restore vector index"):
+            self.vector_store = VectorStore(name=index_name, embedder=self.embedder)
+        # FAISS + BM25 candidates, fused, recency-weighted and de-duplicated
+        self.retriever = HybridRetriever(self.vector_store)
+        self._indexing = None
+        # Set by close(): build_index stops between batches and saves what it has
+        self._stop_indexing = threading.Event()
+        self._ingest = None  # (Ingestor, thread) of the running document ingest
+        # Per-turn indexing and checkpoints happen off the chat loop
+        self.persister = PersistenceWorker(self.vector_store)
+
+    def build_index_in_background(self):
+        """Run build_index in a thread so the chat prompt can show right away."""
+        def run():
+            with timing.phase("build index (new entries)"):
+                self.build_index()
+        self._indexing = threading.Thread(target=run, name="build-index", daemon=True)
+        self._indexing.start()
 
     def build_index(self):
-        """Embeds and indexes both session memory and summaries."""
-        from glob import glob
+        """Embeds and indexes every day's session memory and summaries not yet in the manifest."""
+        messages = []
+        fingerprints = []
 
-        # 👉 Load today’s chat history
-        messages = get_full_session_history()
-        filtered = [m for m in messages if m["role"] in ("user", "assistant")]
+        # 👉 Load every day's chat history
+        for day in list_session_days():
+            for offset, msg in iter_session_history(day):
+                if msg.get("role") in ("user", "assistant"):
+                    messages.append({"role": msg["role"], "content": msg["content"],
+                                     "day": day, "session": day, "kind": "message"})
+                    fingerprints.append(fingerprint(day, offset, msg))
 
-        # 👉 Load summaries too
-        # 👉 Load summaries too
-        from glob import glob
-        summary_files = glob(os.path.join("chat_sessions", "*-summary*.json"))
+        # 👉 Load summaries too (from the catalog, without opening every file)
+        for summary in get_summary_catalog().between():
+            msg = {"role": "system", "content": summary["summary"],
+                   "day": summary["day"], "session": summary["day"], "kind": "summary"}
+            messages.append(msg)
+            fingerprints.append(fingerprint(summary["file"], 0, msg))
 
-        for path in summary_files:
-            try:
-                with open(path, "r", encoding="utf-8") as f:
-                    summary_data = json.load(f)
-                    summary_text = summary_data.get("summary", "").strip()
-                    if summary_text:
-                        filtered.append({
-                            "role": "system",
-                            "content": summary_text
-                        })
-            except Exception as e:
-                print(f"⚠️ Could not read summary file {path}: {e}")
+        stopped = False
+
+        def until_stopped():
+            # Checked per message; add_messages embeds them EMBED_BATCH at a time
+            nonlocal stopped
+            for msg in messages:
+                if self._stop_indexing.is_set():
+                    stopped = True
+                    return
+                yield msg
 
+        new_count = self.vector_store.add_messages(until_stopped(), fingerprints=fingerprints)
+        if new_count == 0 and not stopped:
+            print("🧠 RAG index is up to date.")
+            return
 
-        self.vector_store.add_messages(filtered)
+        print(f"🧠 Indexed {new_count} new memory entries.")
+        if stopped:
+            # The fingerprints of what was indexed are saved, so the next start picks up the rest
+            print("⏸️ Indexing stopped early; the rest is indexed on next start.")
         self.vector_store.save()
 
+    def ingest_in_background(self, paths: list[str]) -> bool:
+        """
+        Bulk-loads text / Markdown / PDF files into the memory index in a
+        thread (see rag/ingest.py). Returns False if an ingest is already running.
+        """
+        if self._ingest is not None and self._ingest[1].is_alive():
+            return False
+        ingestor = Ingestor(self.vector_store)
+
+        def run():
+            try:
+                ingestor.run(paths)
+            except Exception as e:
+                print(f"❌ Ingest failed: {e}")
+        thread = threading.Thread(target=run, name="ingest", daemon=True)
+        self._ingest = (ingestor, thread)
+        thread.start()
+        return True
+
+    def index_messages(self, entries: list[tuple[int, dict]]):
+        """
+        Queue freshly saved messages of the current session, given as
+        (offset, message) pairs, for background indexing.
+        """
+        day = datetime.now().strftime("%Y-%m-%d")
+        messages = []
+        fingerprints = []
+        for offset, msg in entries:
+            if offset is None:
+                continue
+            messages.append({**msg, "day": day, "session": self.session_id, "kind": "message"})
+            fingerprints.append(fingerprint(day, offset, msg))
+        self.persister.submit(messages, fingerprints)
+
+    def close(self):
+        """Flush queued indexing work and write the final index checkpoint."""
+        if self._indexing is not None:
+            self._stop_indexing.set()
+            self._indexing.join()
+        if self._ingest is not None:
+            # An unfinished ingest resumes where it stopped next time
+            self._ingest[0].stop()
+            self._ingest[1].join()
+        self.persister.close()
+        self.vector_store.close()
 
-    def get_context_for(self, query: str, top_k=5) -> list[dict]:
-        """Retrieve top-k relevant memory chunks for the query."""
-        return self.vector_store.search(query, top_k=top_k)
+    def get_context_for(self, query: str, top_k=5, last_days=None, kinds=None, roles=None) -> list[dict]:
+        """
+        Retrieve up to top_k relevant memory chunks for the query, best first,
+        each with its "score" and "similarity"; hits below the relevance
+        cutoff are left out, so fewer may come back.
+        last_days limits the search to recent days (e.g. 30); kinds/roles
+        restrict it to e.g. {"summary"} or {"user"}.
+        """
+        since = None
+        if last_days is not None:
+            since = (datetime.now() - timedelta(days=last_days - 1)).strftime("%Y-%m-%d")
+        with metrics.span("retrieval"):
+            return self.retriever.search(query, top_k=top_k, since=since, kinds=kinds, roles=roles)
@@ -0,0 +1,131 @@
+# rag/retriever.py
+# Hybrid retrieval over a VectorStore. Dense candidates come from FAISS and
+# lexical ones from the store's BM25 (FTS5) index; the two rankings are
+# merged with reciprocal-rank fusion and weighted towards recent days.
+# Candidates whose exact cosine similarity to the query falls below a cutoff
+# are dropped, and the rest are picked with maximal marginal relevance so
+# near-identical turns don't crowd the context.
+
+import re
+from datetime import date
+from typing import Dict, List, Optional
+
+import numpy as np
+
+import metrics
+from .vector_store import VectorStore
+
+# Candidates taken from each ranking, per requested hit (at least MIN_CANDIDATES)
+CANDIDATES_PER_HIT = 4
+MIN_CANDIDATES = 20
+# Reciprocal-rank fusion constant (the usual 60)
+RRF_K = 60
+# Share of the score that depends on age, and the age at which that part halves
+RECENCY_WEIGHT = 0.3
+RECENCY_HALF_LIFE_DAYS = 30
+# Cosine similarity a hit needs; BM25 matches get by with the lower floor
+MIN_SIMILARITY = 0.25
+LEXICAL_MIN_SIMILARITY = 0.1
+# MMR trade-off between relevance (1.0) and diversity (0.0)
+MMR_LAMBDA = 0.7
+# Hits this similar to an already picked one are treated as duplicates
+DUPLICATE_SIMILARITY = 0.95
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def _dedup_key(text: str) -> str:
+    return " ".join(re.findall(r"\w+", text.lower()))
+
+
+class HybridRetriever:
+    def __init__(self, store: VectorStore, min_similarity: float = MIN_SIMILARITY,
+                 lexical_min_similarity: float = LEXICAL_MIN_SIMILARITY, recency_weight: float = RECENCY_WEIGHT,
+                 half_life_days: float = RECENCY_HALF_LIFE_DAYS, mmr_lambda: float = MMR_LAMBDA):
+        self.store = store
+        self.min_similarity = min_similarity
+        self.lexical_min_similarity = lexical_min_similarity
+        self.recency_weight = recency_weight
+        self.half_life_days = half_life_days
+        self.mmr_lambda = mmr_lambda
+
+    def _recency(self, day: Optional[str], today: date) -> float:
+        if not day or not self.recency_weight:
+            return 1.0
+        try:
+            age = max(0, (today - date.fromisoformat(day)).days)
+        except ValueError:
+            return 1.0
+        return 1 - self.recency_weight + self.recency_weight * 0.5 ** (age / self.half_life_days)
+
+    def search(self, query: str, top_k: int = 5, since: Optional[str] = None, until: Optional[str] = None,
+               roles=None, kinds=None, sessions=None) -> List[Dict]:
+        """
+        Up to top_k hits for the query, best first, taking the same filters
+        as VectorStore.search. Each hit is the message metadata plus "score"
+        (fused, recency-weighted) and "similarity" (cosine to the query).
+        """
+        store = self.store
+        if store.size == 0:
+            return []
+        filters = dict(since=since, until=until, roles=roles, kinds=kinds, sessions=sessions)
+        n = max(MIN_CANDIDATES, top_k * CANDIDATES_PER_HIT)
+
+        with metrics.span("embed_query"):
+            query_vec = np.asarray(store.embedder.embed_text(query), dtype="float32")
+        with metrics.span("vector_search"):
+            dense = store.nearest(query_vec, n, **filters)
+        with metrics.span("lexical_search"):
+            lexical = store.meta.lexical_search(query, n, **filters)
+
+        with metrics.span("rerank"):
+            fused = {}
+            for ranking in (dense, lexical):
+                for rank, (idx, _) in enumerate(ranking):
+                    fused[idx] = fused.get(idx, 0.0) + 1.0 / (RRF_K + rank + 1)
+            lexical_ids = {idx for idx, _ in lexical}
+            ids = list(fused)
+            # Vectors from the log, so lexical-only and PQ-compressed hits get a true similarity
+            vectors = _normalize(store.vectors.read_rows(ids))
+            similarities = vectors @ _normalize(query_vec)
+            found = store.meta.get(ids)
+
+            today = date.today()
+            candidates = []
+            for i, idx in enumerate(ids):
+                similarity = float(similarities[i])
+                floor = self.lexical_min_similarity if idx in lexical_ids else self.min_similarity
+                if idx not in found or similarity < floor:
+                    continue
+                meta = found[idx]
+                candidates.append((i, fused[idx] * self._recency(meta.get("day"), today), similarity, meta))
+            return self._select(candidates, vectors, top_k)
+
+    def _select(self, candidates, vectors, top_k) -> List[Dict]:
+        """Maximal marginal relevance over (row, score, similarity, meta) candidates, skipping duplicates."""
+        if not candidates:
+            return []
+        best_score = max(c[1] for c in candidates)
+        remaining = list(candidates)
+        picked = []
+        picked_rows = []
+        seen = set()
+        while remaining and len(picked) < top_k:
+            if picked_rows:
+                redundancy = (vectors[[c[0] for c in remaining]] @ vectors[picked_rows].T).max(axis=1)
+            else:
+                redundancy = np.zeros(len(remaining))
+            gains = [self.mmr_lambda * c[1] / best_score - (1 - self.mmr_lambda) * r
+                     for c, r in zip(remaining, redundancy)]
+            best = int(np.argmax(gains))
+            row, score, similarity, meta = remaining.pop(best)
+            key = _dedup_key(meta["content"])
+            if redundancy[best] >= DUPLICATE_SIMILARITY or key in seen:
+                continue
+            seen.add(key)
+            picked_rows.append(row)
+            picked.append({**meta, "score": round(score, 6), "similarity": round(similarity, 4)})
+        return picked
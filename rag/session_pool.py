@@ -0,0 +1,77 @@
+# rag/session_pool.py
+# Per-session VectorStores for the API. All stores share one Embedder (so
+# concurrent sessions share the model and its micro-batching); only the
+# most recently used max_open stores are kept open. With readonly=True the
+# stores are ReadOnlyVectorStores, for API workers next to an index writer.
+
+import os
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from .embedder import Embedder
+from .vector_store import ReadOnlyVectorStore, VectorStore
+
+SESSIONS_DB_DIR = os.path.join("rag_db", "sessions")
+MAX_OPEN_STORES = 64
+
+
+class SessionVectorStores:
+    def __init__(self, embedder: Embedder, db_dir: str = SESSIONS_DB_DIR, max_open: int = MAX_OPEN_STORES,
+                 readonly: bool = False):
+        self.embedder = embedder
+        self.db_dir = db_dir
+        self.max_open = max_open
+        self.store_class = ReadOnlyVectorStore if readonly else VectorStore
+        self._lock = threading.Lock()
+        # session id -> [VectorStore or None, lock held while the store is in use]
+        self._open = OrderedDict()
+
+    @contextmanager
+    def session(self, session_id: str):
+        """
+        Yields the session's VectorStore. Callers for the same session are
+        serialized; different sessions run in parallel.
+        """
+        while True:
+            with self._lock:
+                entry = self._open.get(session_id)
+                if entry is None:
+                    entry = [None, threading.Lock()]
+                    self._open[session_id] = entry
+                self._open.move_to_end(session_id)
+            with entry[1]:
+                with self._lock:
+                    # Evicted between lookup and lock: start over with a fresh entry
+                    if self._open.get(session_id) is not entry:
+                        continue
+                if entry[0] is None:
+                    entry[0] = self.store_class(name=session_id, embedder=self.embedder, db_dir=self.db_dir)
+                yield entry[0]
+                break
+        self._evict()
+
+    def _evict(self):
+        """Closes least recently used stores that aren't in use."""
+        with self._lock:
+            for session_id in list(self._open):
+                if len(self._open) <= self.max_open:
+                    return
+                store, store_lock = self._open[session_id]
+                if not store_lock.acquire(blocking=False):
+                    continue
+                try:
+                    del self._open[session_id]
+                    if store is not None:
+                        store.close()
+                finally:
+                    store_lock.release()
+
+    def close_all(self):
+        with self._lock:
+            entries = list(self._open.values())
+            self._open.clear()
+        for store, store_lock in entries:
+            with store_lock:
+                if store is not None:
+                    store.close()
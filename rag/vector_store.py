@@ -4,68 +4,592 @@ import faiss
 import numpy as np
 import json
 import os
-from typing import List, Dict
+import sqlite3
+import tempfile
+import threading
+from itertools import islice
+from typing import Iterable, List, Dict, Optional
+import metrics
+from .chunker import Chunker
 from .embedder import Embedder
+from .metadata_store import MetadataStore
+from . import ann
+
+GLOBAL_INDEX = "global"
+# MiniLM embedding size
+DIM = 384
+# Index type the store promotes itself to once it grows past PROMOTE_AT vectors
+DEFAULT_INDEX_TYPE = "hnsw"
+PROMOTE_AT = 20_000
+# save() rewrites the FAISS checkpoint only after this many new vectors
+CHECKPOINT_EVERY = 1_000
+# Chunks embedded and appended per batch by add_messages()
+EMBED_BATCH = 256
+# How new stores keep their vectors ($RAG_VECTOR_PRECISION): "float32",
+# "float16" or "int8"; existing stores keep theirs until rag.migrate converts them
+PRECISIONS = ("float32", "float16", "int8")
+DEFAULT_PRECISION = os.environ.get("RAG_VECTOR_PRECISION", "float32")
+# A lossy index fetches this many times top_k candidates for the exact re-rank
+RERANK_FACTOR = 4
+# Rows converted per step by convert()
+CONVERT_BATCH = 50_000
+# How ReadOnlyVectorStore opens checkpoints: zero-copy mmap of the codes where
+# FAISS supports it (1.8+), its older mmap flag otherwise
+MMAP_FLAGS = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP) | faiss.IO_FLAG_READ_ONLY
+
+
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    """Scales every row to unit length (so L2 ranking equals cosine ranking)."""
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return (vectors / np.maximum(norms, 1e-12)).astype("float32", copy=False)
+
+
+def _batched(items, size):
+    items = iter(items)
+    while batch := list(islice(items, size)):
+        yield batch
+
+
+class VectorLog:
+    """
+    Append-only file of vectors; row i is FAISS id i. Rows are raw float32,
+    float16, or int8 codes with a per-row float32 scale (x ≈ codes * scale),
+    i.e. 4, 2 or ~1 bytes per dimension. Reads always return float32.
+    """
+
+    def __init__(self, path: str, dim: int = DIM, precision: str = "float32"):
+        if precision not in PRECISIONS:
+            raise ValueError(f"Unknown precision {precision!r}, expected one of {PRECISIONS}")
+        self.path = path
+        self.dim = dim
+        self.precision = precision
+        if precision == "int8":
+            self.row_dtype = np.dtype([("scale", "<f4"), ("codes", "i1", (dim,))])
+        else:
+            self.row_dtype = np.dtype((np.dtype(precision).newbyteorder("<"), (dim,)))
+        self.row_bytes = self.row_dtype.itemsize
+        if not os.path.exists(path):
+            open(path, "wb").close()
+
+    @property
+    def count(self) -> int:
+        return os.path.getsize(self.path) // self.row_bytes
+
+    def _encode(self, vectors: np.ndarray) -> bytes:
+        vectors = np.asarray(vectors, dtype="float32").reshape(-1, self.dim)
+        if self.precision != "int8":
+            return np.ascontiguousarray(vectors, dtype=self.row_dtype.base).tobytes()
+        rows = np.zeros(len(vectors), dtype=self.row_dtype)
+        scale = np.abs(vectors).max(axis=1) / 127.0
+        scale[scale == 0] = 1.0
+        rows["scale"] = scale
+        rows["codes"] = np.clip(np.rint(vectors / scale[:, None]), -127, 127)
+        return rows.tobytes()
+
+    def _decode(self, rows: np.ndarray) -> np.ndarray:
+        if self.precision != "int8":
+            return np.asarray(rows, dtype="float32").reshape(-1, self.dim)
+        return (rows["codes"].astype("float32") * rows["scale"][:, None]).reshape(-1, self.dim)
+
+    def _rows(self):
+        return np.memmap(self.path, dtype=self.row_dtype, mode="r", shape=(self.count,))
+
+    def append(self, vectors: np.ndarray):
+        with open(self.path, "ab") as f:
+            f.write(self._encode(vectors))
+
+    def read(self, start: int = 0, end: Optional[int] = None) -> np.ndarray:
+        end = self.count if end is None else end
+        if end <= start:
+            return np.zeros((0, self.dim), dtype="float32")
+        return self._decode(np.array(self._rows()[start:end]))
+
+    def read_rows(self, ids: List[int]) -> np.ndarray:
+        """The logged vectors of the given rows, in the order given."""
+        if not ids:
+            return np.zeros((0, self.dim), dtype="float32")
+        return self._decode(np.array(self._rows()[np.asarray(ids, dtype="int64")]))
+
+    def truncate(self, count: int):
+        with open(self.path, "r+b") as f:
+            f.truncate(count * self.row_bytes)
+
 
 class VectorStore:
-    def __init__(self, session_id: str, embedder: Embedder, db_dir: str = "rag_db"):
-        self.session_id = session_id
+    """
+    A FAISS index plus one metadata row per vector.
+
+    Metadata carries "role" and "content" and, for the global memory index,
+    "day" (YYYY-MM-DD), "session" and "kind" ("message" or "summary"), which
+    search() can filter on. Contents longer than one chunker window are
+    stored as several rows that share a "parent" and number their "chunk".
+
+    On disk a store is three files: {name}.sqlite holds the metadata rows
+    (keyed by FAISS id) and the fingerprint manifest, {name}.vectors is an
+    append-only log of the vectors, and {name}.index is a FAISS
+    checkpoint that is only rewritten every CHECKPOINT_EVERY vectors; vectors
+    logged after the checkpoint are replayed on load.
+
+    The store starts as an exact IndexFlatL2 and, once it holds promote_at
+    vectors, builds an index_type ANN index ("ivf", "hnsw" or "ivfpq") in a
+    background thread and swaps it in. IVF indexes are retrained the same way
+    each time the store doubles in size. The recall@10 of the new index
+    against the flat baseline is reported on every promotion.
+
+    precision ("float32", "float16" or "int8") sets how the vector log and
+    the index keep vectors; normalize scales them to unit length first
+    (defaults to on for the compact precisions). Both are fixed when the
+    store is created and recorded with it; convert() changes them. When the
+    index holds coarser codes than the vector log (IVF-PQ), nearest()
+    over-fetches RERANK_FACTOR times the candidates and re-ranks them
+    against the log.
+    """
+
+    def __init__(self, name: str, embedder: Embedder, db_dir: str = "rag_db",
+                 index_type: str = DEFAULT_INDEX_TYPE, promote_at: int = PROMOTE_AT,
+                 chunker: Optional[Chunker] = None, precision: Optional[str] = None,
+                 normalize: Optional[bool] = None):
+        if index_type not in ann.INDEX_TYPES:
+            raise ValueError(f"Unknown index type {index_type!r}, expected one of {ann.INDEX_TYPES}")
+        if precision is not None and precision not in PRECISIONS:
+            raise ValueError(f"Unknown precision {precision!r}, expected one of {PRECISIONS}")
+        self.name = name
+        self.index_type = index_type
+        # As requested; _load_format() settles them against what the store holds
+        self.precision = precision
+        self.normalize = normalize
+        self.promote_at = promote_at
+        self.trained_size = 0
+        self.recall = None
+        self._lock = threading.RLock()
+        self._promotion = None
         self.embedder = embedder
+        self.chunker = chunker or Chunker()
         self.db_dir = db_dir
-        self.index_path = os.path.join(db_dir, f"{session_id}.index")
-        self.meta_path = os.path.join(db_dir, f"{session_id}_meta.json")
+        self.index_path = os.path.join(db_dir, f"{name}.index")
+        self.vectors_path = os.path.join(db_dir, f"{name}.vectors")
+        self.sqlite_path = os.path.join(db_dir, f"{name}.sqlite")
+        # Pre-SQLite layout, migrated on first load
+        self.meta_path = os.path.join(db_dir, f"{name}_meta.json")
+        self.manifest_path = os.path.join(db_dir, f"{name}_manifest.json")
         self.index = None
-        self.metadata = []
+        self.checkpoint_rows = 0
         os.makedirs(db_dir, exist_ok=True)
         self._load()
 
     def _load(self):
-        # Load FAISS index and metadata if they exist
-        if os.path.exists(self.index_path) and os.path.exists(self.meta_path):
-            self.index = faiss.read_index(self.index_path)
-            with open(self.meta_path, "r", encoding="utf-8") as f:
-                self.metadata = json.load(f)
-        else:
-            # New flat index with 384-dim vectors (MiniLM)
-            self.index = faiss.IndexFlatL2(384)
-            self.metadata = []
+        legacy = all(os.path.exists(p) for p in (self.index_path, self.meta_path, self.manifest_path))
+        fresh = not os.path.exists(self.sqlite_path)
+        self.meta = MetadataStore(self.sqlite_path)
+        self._load_format(fresh and legacy)
+        self.vectors = VectorLog(self.vectors_path, DIM, self.precision)
+
+        if fresh and legacy:
+            self._migrate_legacy()
+        elif fresh and os.path.exists(self.index_path):
+            # Indexes written before the manifest existed hold duplicate vectors
+            # from every restart, so rebuild them from scratch instead.
+            print(f"⚠️ No manifest for {self.index_path}, rebuilding index.")
+            os.replace(self.index_path, self.index_path + ".stale")
+
+        # A crash between logging vectors and committing rows leaves them out of step,
+        # and a torn append leaves a partial row that would misalign every later one
+        count = min(self.meta.count(), self.vectors.count)
+        if os.path.getsize(self.vectors_path) != count * self.vectors.row_bytes:
+            self.vectors.truncate(count)
+        if self.meta.count() > count:
+            self.meta.truncate(count)
+
+        self.index = None
+        if os.path.exists(self.index_path):
+            index = faiss.read_index(self.index_path)
+            if index.ntotal <= count:
+                self.index = ann.configure(index)
+        if self.index is None:
+            self.index = ann.empty(DIM, self.precision)
+        self.checkpoint_rows = self.index.ntotal
+
+        # Replay vectors logged after the last checkpoint
+        tail = self.vectors.read(self.index.ntotal, count)
+        if len(tail):
+            self.index.add(tail)
+
+        self.trained_size = self.meta.get_state("trained_size", 0)
+        self.recall = self.meta.get_state("recall")
+        self._maybe_promote()
+
+    def _load_format(self, legacy: bool):
+        """Adopts the vector format recorded with the store, or records the requested one."""
+        stored = self.meta.get_state("vector_format")
+        if stored is None and (legacy or (os.path.exists(self.vectors_path) and os.path.getsize(self.vectors_path))):
+            # Stores from before vector formats existed hold raw float32
+            stored = {"precision": "float32", "normalize": False}
+        if stored is None:
+            precision = self.precision or DEFAULT_PRECISION
+            normalize = precision != "float32" if self.normalize is None else self.normalize
+            stored = {"precision": precision, "normalize": normalize}
+        elif self.precision not in (None, stored["precision"]) or self.normalize not in (None, stored["normalize"]):
+            print(f"⚠️ {self.name} stores {stored['precision']} vectors "
+                  f"(normalize={stored['normalize']}), run rag.migrate to convert it.")
+        self.precision = stored["precision"]
+        self.normalize = stored["normalize"]
+        self.meta.set_state(vector_format=stored)
+
+    def _migrate_legacy(self):
+        """Moves a {name}_meta.json / _manifest.json store into SQLite and the vector log."""
+        print(f"🧠 Migrating {self.name} metadata to SQLite...")
+        index = ann.configure(faiss.read_index(self.index_path))
+        with open(self.meta_path, "r", encoding="utf-8") as f:
+            metadata = json.load(f)
+        with open(self.manifest_path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        count = min(index.ntotal, len(metadata))
+        self.vectors.append(ann.reconstruct_all(index)[:count])
+        self.meta.append(0, metadata[:count], manifest.get("fingerprints", []))
+        self.meta.set_state(trained_size=manifest.get("trained_size", 0), recall=manifest.get("recall"))
+        for path in (self.meta_path, self.manifest_path):
+            os.replace(path, path + ".migrated")
 
-    def add_messages(self, messages: List[Dict]):
+    def has_fingerprint(self, fingerprint: str) -> bool:
+        return self.meta.has_fingerprint(fingerprint)
+
+    def add_messages(self, messages: Iterable[Dict], fingerprints: Optional[Iterable[str]] = None) -> int:
         """
-        Embed and add messages to the index and metadata list.
+        Embed and add messages to the index and metadata store.
         Expected format: {"role": "user"|"assistant", "content": "..."}
+        If fingerprints are given (one per message), messages already in the
+        manifest are skipped and the new fingerprints are recorded.
+        Long contents are split by the store's chunker, one row per chunk.
+        Messages may be any iterable: chunks are embedded and appended
+        EMBED_BATCH at a time, so a large input is never held in full.
+        Returns the number of messages added.
         """
-        texts = [msg["content"] for msg in messages if msg["content"].strip()]
-        if not texts:
-            return  # Skip empty input
+        pairs = zip(messages, fingerprints) if fingerprints is not None else ((m, None) for m in messages)
+        added = 0
+        seen = set()  # fingerprints added by this call, possibly not yet flushed
+        batch = []
+        batch_fingerprints = []
+        for group in _batched(pairs, EMBED_BATCH):
+            known = self.meta.known_fingerprints(fp for _, fp in group) | seen
+            for msg, fp in group:
+                if not msg["content"].strip():
+                    continue
+                if fp is not None:
+                    if fp in known:
+                        continue
+                    known.add(fp)
+                    seen.add(fp)
+                added += 1
+                for chunk in self.chunker.split(msg, fp):
+                    batch.append(chunk)
+                    if len(batch) >= EMBED_BATCH:
+                        self._append(batch, batch_fingerprints)
+                        batch, batch_fingerprints = [], []
+                # Recorded with (or after) the message's last chunk, so a crash
+                # mid-message gets it re-indexed rather than half indexed
+                if fp is not None:
+                    batch_fingerprints.append(fp)
+        if batch or batch_fingerprints:
+            self._append(batch, batch_fingerprints)
+        if added:
+            self._maybe_promote()
+        return added
+
+    def _append(self, metas: List[Dict], fingerprints: List[str]):
+        """Embeds one batch of rows and appends it to the vector log, the metadata and the index."""
+        vectors = np.zeros((0, DIM), dtype="float32")
+        if metas:
+            vectors = self.embedder.embed_texts([meta["content"] for meta in metas])
+            if vectors.ndim == 1:
+                vectors = vectors.reshape(1, -1)
+            vectors = np.ascontiguousarray(vectors, dtype="float32")
+            if self.normalize:
+                vectors = normalize_rows(vectors)
+
+        with metrics.span("index_append"), self._lock:
+            start = self.vectors.count
+            # Log vectors before rows so a crash never leaves rows without vectors
+            self.vectors.append(vectors)
+            self.meta.append(start, metas, fingerprints)
+            if len(vectors):
+                self.index.add(vectors)
+
+    def current_index_type(self) -> str:
+        return ann.index_type_of(self.index)
 
-        vectors = self.embedder.embed_texts(texts)
-        if vectors.ndim == 1:
-            vectors = vectors.reshape(1, -1)
+    def _maybe_promote(self):
+        """Starts a background (re)build of the ANN index when the store has outgrown the current one."""
+        # Locked so concurrent writers (chat indexing, document ingestion) start one build between them
+        with self._lock:
+            if self.index_type == "flat" or (self._promotion and self._promotion.is_alive()):
+                return
+            ntotal = self.index.ntotal
+            current = self.current_index_type()
+            if current == "flat":
+                due = ntotal >= self.promote_at
+            else:
+                # HNSW grows incrementally; IVF centroids go stale as the data grows
+                due = current in ("ivf", "ivfpq") and ntotal >= 2 * max(self.trained_size, 1)
+            if not due or ntotal < ann.min_training_size(self.index_type, ntotal):
+                return
+            self._promotion = threading.Thread(target=self._promote, name=f"promote-{self.name}", daemon=True)
+            self._promotion.start()
 
-        self.index.add(vectors)
-        self.metadata.extend([msg for msg in messages if msg["content"].strip()])
+    def _promote(self):
+        try:
+            with self._lock:
+                count = self.index.ntotal
+            # The vector log keeps the vectors at full log precision even when the index is lossy (IVF-PQ)
+            snapshot = self.vectors.read(0, count)
+            new_index = ann.build(self.index_type, snapshot, codes=self.precision)
+            recall = ann.recall_at_k(new_index, snapshot)
+            self._write_index(new_index)
+            with self._lock:
+                # Catch up with vectors added while we were training
+                tail = self.vectors.read(count, self.index.ntotal)
+                if len(tail):
+                    new_index.add(tail)
+                self.index = new_index
+                self.checkpoint_rows = count
+                self.trained_size = count
+                self.recall = recall
+                self.meta.set_state(trained_size=count, recall=recall)
+            print(f"🧠 Promoted {self.name} index to {self.index_type} "
+                  f"({count} vectors, recall@10 vs flat: {recall:.3f})")
+        except Exception as e:
+            print(f"⚠️ Index promotion failed, staying on {self.current_index_type()}: {e}")
 
+    def wait_for_promotion(self, timeout: Optional[float] = None):
+        """Blocks until a running background promotion finishes."""
+        if self._promotion is not None:
+            self._promotion.join(timeout)
 
-    def search(self, query: str, top_k: int = 5) -> List[Dict]:
+    @property
+    def size(self) -> int:
+        """Number of searchable vectors."""
+        return self.index.ntotal
+
+    def search(self, query: str, top_k: int = 5, since: Optional[str] = None, until: Optional[str] = None,
+               roles=None, kinds=None, sessions=None) -> List[Dict]:
         """
         Search for top_k most similar messages to the query.
-        Returns message metadata.
+        Optional filters: since/until (inclusive YYYY-MM-DD days) and sets of
+        allowed roles, kinds and sessions. Returns message metadata.
         """
-        if self.index.ntotal == 0:
+        if self.size == 0:
             return []
 
-        query_vec = self.embedder.embed_text(query).reshape(1, -1)
-        distances, indices = self.index.search(query_vec, top_k)
+        with metrics.span("embed_query"):
+            query_vec = self.embedder.embed_text(query).reshape(1, -1)
+        with metrics.span("vector_search"):
+            ids = [idx for idx, _ in self.nearest(query_vec, top_k, since, until, roles, kinds, sessions)]
+            found = self.meta.get(ids)
+            return [found[idx] for idx in ids if idx in found]
+
+    def nearest(self, query_vec: np.ndarray, top_k: int, since: Optional[str] = None, until: Optional[str] = None,
+                roles=None, kinds=None, sessions=None) -> List[tuple]:
+        """(row id, squared L2 distance) of the top_k nearest vectors passing the filters, closest first."""
+        query_vec = np.ascontiguousarray(query_vec, dtype="float32").reshape(1, -1)
+        if self.normalize:
+            query_vec = normalize_rows(query_vec)
+        filtered = any(f is not None for f in (since, until, roles, kinds, sessions))
+        # Re-scoring against the log only helps when it is more precise than the index's codes
+        rerank = ann.code_bits(self.index) < ann.CODE_BITS[self.precision]
+        fetch_k = top_k * RERANK_FACTOR if rerank else top_k
+        if not filtered:
+            _, hits = self._search(query_vec, fetch_k)
+            return self._rerank(query_vec, hits)[:top_k] if rerank else hits
+
+        # Over-fetch and post-filter, widening the search until enough hits pass
+        fetch_k = min(self.size, fetch_k * 4)
+        while True:
+            ntotal, hits = self._search(query_vec, fetch_k)
+            allowed = self.meta.filter_ids([idx for idx, _ in hits], since=since, until=until,
+                                           roles=roles, kinds=kinds, sessions=sessions)
+            hits = [hit for hit in hits if hit[0] in allowed]
+            if len(hits) >= top_k or fetch_k >= ntotal:
+                return (self._rerank(query_vec, hits) if rerank else hits)[:top_k]
+            fetch_k = min(ntotal, fetch_k * 4)
+
+    def _search(self, query_vec: np.ndarray, k: int) -> tuple:
+        """(vectors searched, [(row id, distance)]) of the k nearest vectors in the index."""
+        with self._lock:
+            ntotal = self.index.ntotal
+            distances, indices = self.index.search(query_vec, k)
+        return ntotal, [(int(idx), float(d)) for idx, d in zip(indices[0], distances[0]) if idx >= 0]
+
+    def _rerank(self, query_vec: np.ndarray, hits: List[tuple]) -> List[tuple]:
+        """Re-scores index hits against the vectors in the log, closest first."""
+        ids = [idx for idx, _ in hits]
+        vectors = self.vectors.read_rows(ids)
+        distances = ((vectors - query_vec) ** 2).sum(axis=1)
+        return sorted(((idx, float(d)) for idx, d in zip(ids, distances)), key=lambda hit: hit[1])
+
+    def convert(self, precision: str, normalize: Optional[bool] = None):
+        """
+        Rewrites the vector log at the given precision (normalizing it if
+        asked) and rebuilds the index to match, CONVERT_BATCH rows at a time.
+        """
+        if precision not in PRECISIONS:
+            raise ValueError(f"Unknown precision {precision!r}, expected one of {PRECISIONS}")
+        normalize = precision != "float32" if normalize is None else normalize
+        self.wait_for_promotion()
+        with self._lock:
+            count = self.vectors.count
+            tmp_path = self.vectors_path + ".tmp"
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            converted = VectorLog(tmp_path, DIM, precision)
+            for start in range(0, count, CONVERT_BATCH):
+                batch = self.vectors.read(start, min(count, start + CONVERT_BATCH))
+                converted.append(normalize_rows(batch) if normalize else batch)
+
+            # Build the index before swapping files, so a failure leaves the store as it was
+            index_type = self.current_index_type()
+            if index_type == "flat" or count < ann.min_training_size(index_type, count):
+                index = ann.empty(DIM, precision)
+                index.add(converted.read())
+                trained_size = 0
+            else:
+                index = ann.build(index_type, converted.read(), codes=precision)
+                trained_size = count
+            os.replace(tmp_path, self.vectors_path)
+            self.vectors = VectorLog(self.vectors_path, DIM, precision)
+            self.precision = precision
+            self.normalize = normalize
+            self.index = index
+            self.trained_size = trained_size
+            self.meta.set_state(vector_format={"precision": precision, "normalize": normalize},
+                                trained_size=trained_size)
+            self._write_index(index)
+            self.checkpoint_rows = index.ntotal
+
+
+    def _write_index(self, index):
+        # A temp file of its own: promotion writes outside the lock, alongside checkpoint()
+        fd, tmp_path = tempfile.mkstemp(prefix=f"{self.name}.index.", suffix=".tmp", dir=self.db_dir)
+        os.close(fd)
+        try:
+            faiss.write_index(index, tmp_path)
+            os.replace(tmp_path, self.index_path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+    def checkpoint(self):
+        """Writes the FAISS index to disk now, so the next load replays nothing."""
+        with self._lock:
+            if self.index.ntotal != self.checkpoint_rows:
+                with metrics.span("index_save"):
+                    self._write_index(self.index)
+                self.checkpoint_rows = self.index.ntotal
 
-        results = []
-        for idx in indices[0]:
-            if 0 <= idx < len(self.metadata):
-                results.append(self.metadata[idx])
-        return results
+    def save(self):
+        """
+        Rows and vectors are persisted as they are added; this only rewrites
+        the FAISS checkpoint once enough new vectors have piled up.
+        """
+        if self.index.ntotal - self.checkpoint_rows >= CHECKPOINT_EVERY:
+            self.checkpoint()
+
+    def close(self):
+        self.wait_for_promotion()
+        self.checkpoint()
+        self.meta.close()
+
+
+class ReadOnlyVectorStore(VectorStore):
+    """
+    A read-only view of a store that another process writes, used by the API
+    workers in multi-worker mode (see index_writer.py). The FAISS checkpoint
+    is memory-mapped, so the workers share its pages, and vectors the writer
+    logged after its last checkpoint are searched exactly. Every search first
+    picks up a new checkpoint or newly logged vectors. A store the writer
+    hasn't created yet is empty.
+    """
+
+    def _load(self):
+        self.meta = None
+        self.vectors = None
+        self.index = ann.empty(DIM)
+        self._tail = None  # flat index of the vectors logged after the checkpoint
+        self._tail_end = 0
+        self._checkpoint_key = None
+        self.refresh()
 
+    def _open(self) -> bool:
+        """Opens the metadata and the vector log once the writer has created them."""
+        if not os.path.exists(self.sqlite_path):
+            return False
+        try:
+            if self.meta is None:
+                self.meta = MetadataStore(self.sqlite_path, readonly=True)
+            stored = self.meta.get_state("vector_format")
+        except sqlite3.OperationalError:
+            # Caught the writer creating the schema
+            return False
+        if stored is None or not os.path.exists(self.vectors_path):
+            return False
+        self.precision = stored["precision"]
+        self.normalize = stored["normalize"]
+        self.vectors = VectorLog(self.vectors_path, DIM, self.precision)
+        return True
+
+    def refresh(self):
+        """Maps a newer checkpoint and indexes vectors logged since the last refresh."""
+        with self._lock:
+            if self.vectors is None and not self._open():
+                return
+            try:
+                stat = os.stat(self.index_path)
+                key = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+            except FileNotFoundError:
+                key = None
+            count = self.vectors.count
+            if key != self._checkpoint_key:
+                self.index = ann.configure(faiss.read_index(self.index_path, MMAP_FLAGS)) if key else ann.empty(DIM, self.precision)
+                self._checkpoint_key = key
+                self._tail = None
+            if self._tail is None or count < self._tail_end:
+                self._tail = faiss.IndexFlatL2(DIM)
+                self._tail_end = self.index.ntotal
+            if count > self._tail_end:
+                self._tail.add(self.vectors.read(self._tail_end, count))
+                self._tail_end = count
+
+    @property
+    def size(self) -> int:
+        self.refresh()
+        return self.index.ntotal + (self._tail.ntotal if self._tail is not None else 0)
+
+    def _search(self, query_vec: np.ndarray, k: int) -> tuple:
+        with self._lock:
+            self.refresh()
+            hits = []
+            base = self.index.ntotal
+            for index, offset in ((self.index, 0), (self._tail, base)):
+                if index is not None and index.ntotal:
+                    distances, indices = index.search(query_vec, min(k, index.ntotal))
+                    hits.extend((int(idx) + offset, float(d)) for idx, d in zip(indices[0], distances[0]) if idx >= 0)
+            ntotal = base + (self._tail.ntotal if self._tail is not None else 0)
+        return ntotal, sorted(hits, key=lambda hit: hit[1])[:k]
+
+    def add_messages(self, messages, fingerprints=None) -> int:
+        raise RuntimeError(f"{self.name} is read-only in this process; the index writer adds to it")
+
+    def convert(self, precision, normalize=None):
+        raise RuntimeError(f"{self.name} is read-only in this process")
+
+    def _maybe_promote(self):
+        pass
+
+    def checkpoint(self):
+        pass
 
     def save(self):
-        faiss.write_index(self.index, self.index_path)
-        with open(self.meta_path, "w", encoding="utf-8") as f:
-            json.dump(self.metadata, f, ensure_ascii=False, indent=2)
+        pass
+
+    def close(self):
+        with self._lock:
+            if self.meta is not None:
+                self.meta.close()
@@ -0,0 +1,89 @@
+# session_locks.py
+# Per-session mutual exclusion for api.py, so two /chat calls to one session
+# run one after the other (prompt, reply, stored exchange and title) instead
+# of interleaving. Within a worker an asyncio.Lock per session queues callers
+# in arrival order; with a lock_dir the lock is also held across worker
+# processes through a lock file (one of LOCK_STRIPES, picked by hashing the
+# session id), polled without blocking the event loop.
+
+import asyncio
+import hashlib
+import os
+from contextlib import asynccontextmanager
+from typing import Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# Lock files shared by all sessions; unrelated sessions rarely share one
+LOCK_STRIPES = 1024
+# Polling interval while another process holds the lock (seconds, doubling up to the max)
+POLL_MIN = 0.002
+POLL_MAX = 0.05
+
+
+def try_lock(fd: int) -> bool:
+    """Takes an exclusive lock on an open file without waiting; False if another holder has it."""
+    try:
+        if fcntl is not None:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+        return True
+    except OSError:
+        return False
+
+
+def unlock(fd: int):
+    if fcntl is not None:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+    else:
+        msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+
+
+class SessionLocks:
+    def __init__(self, lock_dir: Optional[str] = None, stripes: int = LOCK_STRIPES):
+        self.lock_dir = lock_dir
+        self.stripes = stripes
+        # session id -> [asyncio.Lock, holders + waiters]
+        self._locks = {}
+        if lock_dir:
+            os.makedirs(lock_dir, exist_ok=True)
+
+    def _lock_path(self, session_id: str) -> str:
+        stripe = int(hashlib.sha1(session_id.encode("utf-8")).hexdigest(), 16) % self.stripes
+        return os.path.join(self.lock_dir, f"{stripe:04d}.lock")
+
+    async def _lock_file(self, session_id: str) -> int:
+        fd = os.open(self._lock_path(session_id), os.O_RDWR | os.O_CREAT)
+        delay = POLL_MIN
+        try:
+            while not try_lock(fd):
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, POLL_MAX)
+        except BaseException:
+            os.close(fd)
+            raise
+        return fd
+
+    @asynccontextmanager
+    async def hold(self, session_id: str):
+        """Holds the session's lock for the enclosed block."""
+        entry = self._locks.setdefault(session_id, [asyncio.Lock(), 0])
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                fd = await self._lock_file(session_id) if self.lock_dir else None
+                try:
+                    yield
+                finally:
+                    if fd is not None:
+                        unlock(fd)
+                        os.close(fd)
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._locks[session_id]
@@ -0,0 +1,306 @@
+# storage.py
+# Session and message storage for api.py. SQLiteSessionStore (the default)
+# keeps everything on disk with indexes for keyset pagination plus an LRU of
+# hot sessions; MemorySessionStore keeps the old process-local behaviour.
+# When several API workers share the database (shared=True) the LRU is off,
+# since one worker can't see another's appends.
+#
+# List calls return (items, next_cursor). Cursors are opaque strings; pass
+# one back to continue after the last item, None means there is no more.
+
+import base64
+import json
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+DEFAULT_DB_PATH = os.path.join("chat_sessions", "api.sqlite")
+# Sessions whose metadata and recent messages are kept in memory
+HOT_SESSIONS = 256
+# Messages per hot session kept in memory (enough for chat context)
+HOT_MESSAGES = 50
+
+
+def encode_cursor(*values) -> str:
+    return base64.urlsafe_b64encode(json.dumps(values).encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor: str, *types) -> list:
+    """The values of a cursor from encode_cursor(), which must be one of each of types."""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except (ValueError, UnicodeError) as e:
+        raise ValueError("Invalid cursor") from e
+    # bool is an int to isinstance, but never a valid cursor value
+    if (not isinstance(values, list) or len(values) != len(types)
+            or not all(isinstance(v, t) and not isinstance(v, bool) for v, t in zip(values, types))):
+        raise ValueError("Invalid cursor")
+    return values
+
+
+class SessionStore:
+    """Interface every storage backend implements."""
+
+    def create_session(self, session: Dict):
+        raise NotImplementedError
+
+    def get_session(self, session_id: str) -> Optional[Dict]:
+        raise NotImplementedError
+
+    def list_sessions(self, limit: int, cursor: Optional[str] = None) -> Tuple[List[Dict], Optional[str]]:
+        """Sessions newest first."""
+        raise NotImplementedError
+
+    def set_title(self, session_id: str, title: str):
+        raise NotImplementedError
+
+    def append_messages(self, session_id: str, messages: List[Dict]) -> int:
+        """Appends messages and returns the session's new message count."""
+        raise NotImplementedError
+
+    def get_messages(self, session_id: str, limit: int, cursor: Optional[str] = None) -> Tuple[List[Dict], Optional[str]]:
+        """Messages oldest first."""
+        raise NotImplementedError
+
+    def recent_messages(self, session_id: str, limit: int) -> List[Dict]:
+        """The last `limit` messages, oldest first."""
+        raise NotImplementedError
+
+    def session_count(self) -> int:
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class MemorySessionStore(SessionStore):
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.sessions: Dict[str, Dict] = {}
+        self.messages: Dict[str, List[Dict]] = {}
+
+    def create_session(self, session):
+        with self._lock:
+            self.sessions[session["id"]] = dict(session)
+            self.messages[session["id"]] = []
+
+    def get_session(self, session_id):
+        with self._lock:
+            session = self.sessions.get(session_id)
+            return dict(session) if session else None
+
+    def list_sessions(self, limit, cursor=None):
+        with self._lock:
+            sessions = sorted(self.sessions.values(), key=lambda s: (s["created_at"], s["id"]), reverse=True)
+        if cursor:
+            after = tuple(decode_cursor(cursor, str, str))
+            sessions = [s for s in sessions if (s["created_at"], s["id"]) < after]
+        page = [dict(s) for s in sessions[:limit]]
+        more = len(sessions) > limit
+        return page, encode_cursor(page[-1]["created_at"], page[-1]["id"]) if more and page else None
+
+    def set_title(self, session_id, title):
+        with self._lock:
+            self.sessions[session_id]["title"] = title
+
+    def append_messages(self, session_id, messages):
+        with self._lock:
+            self.messages.setdefault(session_id, []).extend(dict(m) for m in messages)
+            return len(self.messages[session_id])
+
+    def get_messages(self, session_id, limit, cursor=None):
+        start = decode_cursor(cursor, int)[0] if cursor else 0
+        with self._lock:
+            messages = self.messages.get(session_id, [])
+            page = [dict(m) for m in messages[start:start + limit]]
+            more = start + limit < len(messages)
+        return page, encode_cursor(start + limit) if more else None
+
+    def recent_messages(self, session_id, limit):
+        with self._lock:
+            return [dict(m) for m in self.messages.get(session_id, [])[-limit:]]
+
+    def session_count(self):
+        with self._lock:
+            return len(self.sessions)
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    id TEXT PRIMARY KEY,
+    title TEXT NOT NULL,
+    created_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS sessions_created ON sessions(created_at DESC, id DESC);
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    session_id TEXT NOT NULL,
+    role TEXT NOT NULL,
+    content TEXT NOT NULL,
+    timestamp TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS messages_session ON messages(session_id, id);
+"""
+
+
+class SQLiteSessionStore(SessionStore):
+    def __init__(self, path: str = DEFAULT_DB_PATH, hot_sessions: int = HOT_SESSIONS):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self.hot_sessions = hot_sessions
+        self._lock = threading.RLock()
+        # session id -> {"session": dict, "count": int, "recent": list}
+        self._hot = OrderedDict()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self.conn.commit()
+
+    def _cache(self, session_id) -> Optional[Dict]:
+        """
+        Returns the hot entry for a session, loading it on a miss. Always
+        None when the LRU is off; callers then query the database directly.
+        """
+        if self.hot_sessions <= 0:
+            return None
+        entry = self._hot.get(session_id)
+        if entry is not None:
+            self._hot.move_to_end(session_id)
+            return entry
+        session = self._query_session(session_id)
+        if session is None:
+            return None
+        count = self.conn.execute("SELECT COUNT(*) FROM messages WHERE session_id = ?", (session_id,)).fetchone()[0]
+        recent = self._query_recent(session_id, HOT_MESSAGES)
+        entry = {"session": session, "count": count, "recent": recent}
+        self._remember(session_id, entry)
+        return entry
+
+    def _remember(self, session_id, entry):
+        self._hot[session_id] = entry
+        self._hot.move_to_end(session_id)
+        while len(self._hot) > self.hot_sessions:
+            self._hot.popitem(last=False)
+
+    def _query_session(self, session_id) -> Optional[Dict]:
+        row = self.conn.execute("SELECT id, title, created_at FROM sessions WHERE id = ?", (session_id,)).fetchone()
+        return {"id": row[0], "title": row[1], "created_at": row[2]} if row else None
+
+    def _query_recent(self, session_id, limit):
+        rows = self.conn.execute(
+            "SELECT role, content, timestamp FROM messages WHERE session_id = ? ORDER BY id DESC LIMIT ?",
+            (session_id, limit),
+        ).fetchall()
+        return [{"role": r[0], "content": r[1], "timestamp": r[2]} for r in reversed(rows)]
+
+    def create_session(self, session):
+        with self._lock, self.conn:
+            self.conn.execute("INSERT INTO sessions VALUES (?, ?, ?)", (session["id"], session["title"], session["created_at"]))
+            self._remember(session["id"], {"session": dict(session), "count": 0, "recent": []})
+
+    def get_session(self, session_id):
+        with self._lock:
+            if self.hot_sessions <= 0:
+                return self._query_session(session_id)
+            entry = self._cache(session_id)
+            return dict(entry["session"]) if entry else None
+
+    def list_sessions(self, limit, cursor=None):
+        with self._lock:
+            if cursor:
+                created_at, session_id = decode_cursor(cursor, str, str)
+                rows = self.conn.execute(
+                    "SELECT id, title, created_at FROM sessions WHERE (created_at, id) < (?, ?) "
+                    "ORDER BY created_at DESC, id DESC LIMIT ?",
+                    (created_at, session_id, limit + 1),
+                ).fetchall()
+            else:
+                rows = self.conn.execute(
+                    "SELECT id, title, created_at FROM sessions ORDER BY created_at DESC, id DESC LIMIT ?",
+                    (limit + 1,),
+                ).fetchall()
+        page = [{"id": r[0], "title": r[1], "created_at": r[2]} for r in rows[:limit]]
+        more = len(rows) > limit
+        return page, encode_cursor(page[-1]["created_at"], page[-1]["id"]) if more else None
+
+    def set_title(self, session_id, title):
+        with self._lock, self.conn:
+            self.conn.execute("UPDATE sessions SET title = ? WHERE id = ?", (title, session_id))
+            entry = self._hot.get(session_id)
+            if entry is not None:
+                entry["session"]["title"] = title
+
+    def append_messages(self, session_id, messages):
+        with self._lock:
+            entry = self._cache(session_id)
+            with self.conn:
+                self.conn.executemany(
+                    "INSERT INTO messages (session_id, role, content, timestamp) VALUES (?, ?, ?, ?)",
+                    [(session_id, m["role"], m["content"], m["timestamp"]) for m in messages],
+                )
+            if entry is None:
+                return self.conn.execute("SELECT COUNT(*) FROM messages WHERE session_id = ?", (session_id,)).fetchone()[0]
+            entry["count"] += len(messages)
+            entry["recent"] = (entry["recent"] + [dict(m) for m in messages])[-HOT_MESSAGES:]
+            return entry["count"]
+
+    def messages_after(self, after_id: int, limit: int) -> List[Dict]:
+        """
+        Messages of every session with a row id above after_id, in the order
+        they were stored, each with its "id" and "session_id" (for the index writer).
+        """
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT id, session_id, role, content, timestamp FROM messages WHERE id > ? ORDER BY id LIMIT ?",
+                (after_id, limit),
+            ).fetchall()
+        return [{"id": r[0], "session_id": r[1], "role": r[2], "content": r[3], "timestamp": r[4]} for r in rows]
+
+    def last_message_id(self) -> int:
+        with self._lock:
+            return self.conn.execute("SELECT COALESCE(MAX(id), 0) FROM messages").fetchone()[0]
+
+    def get_messages(self, session_id, limit, cursor=None):
+        after = decode_cursor(cursor, int)[0] if cursor else 0
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT id, role, content, timestamp FROM messages WHERE session_id = ? AND id > ? ORDER BY id LIMIT ?",
+                (session_id, after, limit + 1),
+            ).fetchall()
+        page = [{"role": r[1], "content": r[2], "timestamp": r[3]} for r in rows[:limit]]
+        more = len(rows) > limit
+        return page, encode_cursor(rows[limit - 1][0]) if more else None
+
+    def recent_messages(self, session_id, limit):
+        with self._lock:
+            entry = self._cache(session_id)
+            if entry is not None and limit <= HOT_MESSAGES:
+                return [dict(m) for m in entry["recent"][-limit:]]
+            return self._query_recent(session_id, limit)
+
+    def session_count(self):
+        with self._lock:
+            return self.conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+
+def create_store(kind: Optional[str] = None, path: Optional[str] = None, shared: bool = False) -> SessionStore:
+    """
+    Builds the backend named by kind (or $CHAT_STORAGE): "sqlite" (default)
+    or "memory". shared=True is for a database used by several processes.
+    """
+    kind = kind or os.environ.get("CHAT_STORAGE", "sqlite")
+    if kind == "memory":
+        if shared:
+            raise ValueError("The memory backend can't be shared between processes, use sqlite")
+        return MemorySessionStore()
+    if kind == "sqlite":
+        return SQLiteSessionStore(path or os.environ.get("CHAT_DB_PATH", DEFAULT_DB_PATH),
+                                  hot_sessions=0 if shared else HOT_SESSIONS)
+    raise ValueError(f"Unknown storage backend {kind!r}")
@@ -0,0 +1,212 @@
+# summarizer.py
+# Background summarization of the daily chat logs. Instead of sending the
+# whole day to the LLM when the user types `exit`, the worker summarizes each
+# batch of SUMMARIZE_EVERY new messages while the chat goes on (map) and
+# merges those partial summaries into the day's summary when the session
+# ends (reduce), asking for the summary and the title concurrently.
+# Progress lives in chat_sessions/summary_jobs.json, so jobs that are still
+# pending when the user exits are resumed on the next start.
+
+import json
+import os
+import threading
+from datetime import datetime
+from itertools import islice
+
+import journal
+from llm_client import get_client
+from memory import SESSIONS_DIR, get_session_filename, list_session_days, save_summary, save_title
+from prompt_builder import count_tokens, message_tokens, truncate
+
+STATE_PATH = os.path.join(SESSIONS_DIR, "summary_jobs.json")
+# Summarize once this many new messages have accumulated
+SUMMARIZE_EVERY = 16
+# Conversation tokens sent in one map request
+MAP_TOKEN_BUDGET = 2000
+# Partial-summary tokens merged in one reduce request
+REDUCE_TOKEN_BUDGET = 2000
+# Longest single message passed to the summarizer
+MAX_MESSAGE_TOKENS = 500
+# Summarization requests in flight at once
+SUMMARY_WORKERS = 2
+# Seconds `exit` waits for pending jobs before leaving them for the next start
+EXIT_GRACE = 2.0
+
+SUMMARY_PROMPT = "You are an assistant memory tool. Summarize this conversation in bullet points capturing the user's key traits, interests, goals, and background."
+MERGE_PROMPT = "You are an assistant memory tool. Merge these partial summaries of one conversation into a single bullet-point summary of the user's key traits, interests, goals, and background. Drop repeated points."
+
+
+def _split(items, budget, cost):
+    """Groups items, in order, so that each group's total cost fits in budget."""
+    group, used = [], 0
+    for item in items:
+        item_cost = cost(item)
+        if group and used + item_cost > budget:
+            yield group
+            group, used = [], 0
+        group.append(item)
+        used += item_cost
+    if group:
+        yield group
+
+
+def _parallel(fn, items):
+    """
+    Calls fn on every item, SUMMARY_WORKERS at a time, and returns the results
+    in order. Daemon threads, so exiting the chat never waits on the LLM.
+    """
+    results = [None] * len(items)
+    errors = []
+
+    def call(i, item):
+        try:
+            results[i] = fn(item)
+        except Exception as e:
+            errors.append(e)
+
+    for start in range(0, len(items), SUMMARY_WORKERS):
+        threads = [threading.Thread(target=call, args=(i, items[i]), name="summarize", daemon=True)
+                   for i in range(start, min(start + SUMMARY_WORKERS, len(items)))]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        if errors:
+            raise errors[0]
+    return results
+
+
+def summarize_chunk(messages):
+    """Map step: bullet-point summary of a slice of the conversation."""
+    prompt = [
+        {"role": "system", "content": SUMMARY_PROMPT},
+        *messages,
+        {"role": "user", "content": "Please summarize the conversation so far."}
+    ]
+    return get_client().chat(prompt, temperature=0.3)
+
+
+def _merge_prompt(partials, request):
+    parts = "\n\n".join(f"Part {i}:\n{p}" for i, p in enumerate(partials, 1))
+    return [
+        {"role": "system", "content": MERGE_PROMPT},
+        {"role": "user", "content": f"{parts}\n\n{request}"}
+    ]
+
+
+def merge_summaries(partials):
+    """Reduce step: one summary for several partial ones."""
+    if len(partials) == 1:
+        return partials[0]
+    return get_client().chat(_merge_prompt(partials, "Please merge these summaries."), temperature=0.3)
+
+
+def generate_title(partials):
+    return get_client().chat(_merge_prompt(partials, "Give a 3-5 word title for this chat."), temperature=0.3)
+
+
+def reduce_summaries(partials):
+    """
+    Merges partial summaries into (summary, title). Summaries that don't fit
+    in one request are merged in rounds first; the final summary and the title
+    are requested concurrently.
+    """
+    while True:
+        # Any two partials fit together, so every round shrinks the list
+        partials = [truncate(p, REDUCE_TOKEN_BUDGET // 2) for p in partials]
+        if sum(count_tokens(p) for p in partials) <= REDUCE_TOKEN_BUDGET:
+            break
+        partials = _parallel(merge_summaries, list(_split(partials, REDUCE_TOKEN_BUDGET, count_tokens)))
+    summary, title = _parallel(lambda job: job(partials), [merge_summaries, generate_title])
+    return summary.strip(), title.strip()
+
+
+class SummaryWorker:
+    def __init__(self, every=SUMMARIZE_EVERY, state_path=STATE_PATH):
+        self.every = every
+        self.state_path = state_path
+        # day -> {"offset": messages already summarized, "partials": summaries not yet merged}
+        self._state = self._load_state()
+        self._wake = True  # first pass finishes jobs left over from earlier runs
+        self._closed = False
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name="summarizer", daemon=True)
+        self._thread.start()
+
+    def _load_state(self):
+        if os.path.exists(self.state_path):
+            try:
+                with open(self.state_path, "r", encoding="utf-8") as f:
+                    return json.load(f)
+            except (json.JSONDecodeError, OSError) as e:
+                print(f"⚠️ Could not load {self.state_path}, summarizing from scratch: {e}")
+                return {}
+        # First run: earlier days were already summarized on exit
+        today = datetime.now().strftime("%Y-%m-%d")
+        return {day: {"offset": journal.count_records(get_session_filename(day)), "partials": []}
+                for day in list_session_days() if day < today}
+
+    def _save_state(self):
+        tmp_path = self.state_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self._state, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.state_path)
+
+    def notify(self):
+        """Call after saving messages; summarizes once enough new ones have accumulated."""
+        with self._cond:
+            self._wake = True
+            self._cond.notify()
+
+    def close(self, timeout=EXIT_GRACE) -> bool:
+        """
+        Summarizes the rest of today and stops, waiting at most `timeout`
+        seconds. Returns False if jobs are left for the next start.
+        """
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._thread.join(timeout)
+        return not self._thread.is_alive()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._wake and not self._closed:
+                    self._cond.wait()
+                self._wake = False
+                closing = self._closed
+            today = datetime.now().strftime("%Y-%m-%d")
+            for day in list_session_days():
+                try:
+                    # Earlier days are complete; today only once the session ends
+                    self._summarize_day(day, finish=closing or day < today)
+                except Exception as e:
+                    print(f"❌ Background summarization of {day} failed: {e}")
+            if closing:
+                return
+
+    def _summarize_day(self, day, finish):
+        path = get_session_filename(day)
+        entry = self._state.setdefault(day, {"offset": 0, "partials": []})
+        total = journal.count_records(path)
+        pending = total - entry["offset"]
+        if not finish:
+            # Only whole batches while the session is still going
+            pending -= pending % self.every
+        if pending > 0:
+            records = list(islice(journal.iter_records(path), entry["offset"], entry["offset"] + pending))
+            messages = [{"role": r["role"], "content": truncate(r["content"], MAX_MESSAGE_TOKENS)}
+                        for r in records if r.get("role") in ("user", "assistant") and r.get("content")]
+            chunks = list(_split(messages, MAP_TOKEN_BUDGET, message_tokens))
+            entry["partials"].extend(p.strip() for p in _parallel(summarize_chunk, chunks) if p.strip())
+            entry["offset"] += len(records)
+            self._save_state()
+        if finish and entry["partials"]:
+            summary, title = reduce_summaries(entry["partials"])
+            if summary:
+                save_summary(summary, day=day)
+            if title:
+                save_title(title)
+            entry["partials"] = []
+            self._save_state()
@@ -0,0 +1,143 @@
+# summary_catalog.py
+# SQLite catalog of the session summaries, so startup and indexing read one
+# indexed table instead of globbing chat_sessions/ and opening every
+# *-summary*.json file. The JSON files are still written next to the logs;
+# the catalog holds a copy of each summary's text plus its day and sequence
+# number, and hands out the next sequence number atomically.
+#
+# Existing summary files are imported the first time the catalog is opened.
+
+import json
+import os
+import sqlite3
+import threading
+from typing import Dict, List, Optional
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS summaries (
+    day TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    file TEXT NOT NULL,
+    summary TEXT NOT NULL DEFAULT '',
+    created_at TEXT,
+    PRIMARY KEY (day, seq)
+);
+CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value TEXT);
+"""
+
+
+def parse_summary_filename(name: str):
+    """
+    Returns (day, seq) for YYYY-MM-DD-summary.json (seq 0) or
+    YYYY-MM-DD-summary_N.json, or None for any other file name.
+    """
+    if len(name) < 10 or name[4] != "-" or name[7] != "-" or not name.endswith(".json"):
+        return None
+    day, rest = name[:10], name[10:-len(".json")]
+    if rest == "-summary":
+        return day, 0
+    if rest.startswith("-summary_") and rest[len("-summary_"):].isdigit():
+        return day, int(rest[len("-summary_"):])
+    return None
+
+
+def _from_row(row: tuple) -> Dict:
+    return {"day": row[0], "seq": row[1], "file": row[2], "summary": row[3], "created_at": row[4]}
+
+
+class SummaryCatalog:
+    def __init__(self, sessions_dir: str, path: Optional[str] = None):
+        self.sessions_dir = sessions_dir
+        self.path = path or os.path.join(sessions_dir, "summaries.sqlite")
+        self._lock = threading.RLock()
+        # Autocommit; allocate() opens its own write transaction
+        self.conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        if self._get_state("imported") is None:
+            self.import_files()
+
+    def _get_state(self, key: str):
+        row = self.conn.execute("SELECT value FROM state WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def import_files(self) -> int:
+        """Catalogs every summary file in the sessions directory (one directory scan). Returns how many were new."""
+        found = []
+        with os.scandir(self.sessions_dir) as entries:
+            for entry in entries:
+                parsed = parse_summary_filename(entry.name)
+                if parsed is None:
+                    continue
+                try:
+                    with open(entry.path, "r", encoding="utf-8") as f:
+                        data = json.load(f)
+                except (json.JSONDecodeError, OSError):
+                    print(f"⚠️ Could not load summary file {entry.path}. Ignoring.")
+                    continue
+                found.append((*parsed, entry.name, data.get("summary", "").strip(), data.get("created_at")))
+        with self._lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                before = self.count()
+                self.conn.executemany("INSERT OR IGNORE INTO summaries VALUES (?, ?, ?, ?, ?)", found)
+                self.conn.execute("INSERT OR REPLACE INTO state VALUES ('imported', 'true')")
+                added = self.count() - before
+                self.conn.execute("COMMIT")
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+        return added
+
+    def allocate(self, day: str) -> int:
+        """
+        Reserves and returns the day's next sequence number. Safe across
+        threads and processes: the read and the insert share one write lock.
+        """
+        with self._lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                seq = self.conn.execute("SELECT COALESCE(MAX(seq), 0) + 1 FROM summaries WHERE day = ?", (day,)).fetchone()[0]
+                self.conn.execute("INSERT INTO summaries (day, seq, file) VALUES (?, ?, ?)",
+                                  (day, seq, f"{day}-summary_{seq}.json"))
+                self.conn.execute("COMMIT")
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+        return seq
+
+    def record(self, day: str, seq: int, summary: str, created_at: str):
+        """Stores the text of a summary whose number was reserved with allocate()."""
+        with self._lock:
+            self.conn.execute("UPDATE summaries SET summary = ?, created_at = ? WHERE day = ? AND seq = ?",
+                              (summary, created_at, day, seq))
+
+    def release(self, day: str, seq: int):
+        """Drops a reservation whose summary file could not be written."""
+        with self._lock:
+            self.conn.execute("DELETE FROM summaries WHERE day = ? AND seq = ?", (day, seq))
+
+    def between(self, since: Optional[str] = None, until: Optional[str] = None) -> List[Dict]:
+        """Non-empty summaries with since <= day <= until (YYYY-MM-DD, inclusive), oldest first."""
+        clauses = ["summary != ''"]
+        params = []
+        if since is not None:
+            clauses.append("day >= ?")
+            params.append(since)
+        if until is not None:
+            clauses.append("day <= ?")
+            params.append(until)
+        with self._lock:
+            rows = self.conn.execute(
+                f"SELECT * FROM summaries WHERE {' AND '.join(clauses)} ORDER BY day, seq", params
+            ).fetchall()
+        return [_from_row(row) for row in rows]
+
+    def count(self) -> int:
+        with self._lock:
+            return self.conn.execute("SELECT COUNT(*) FROM summaries").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
@@ -0,0 +1,41 @@
+# tests/test_api_ingest.py
+
+import importlib
+import os
+
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("httpx")
+from fastapi.testclient import TestClient
+
+
+@pytest.fixture
+def api(tmp_path, monkeypatch):
+    # api.py opens its session store in the working directory on import
+    monkeypatch.chdir(tmp_path)
+    import api
+    api = importlib.reload(api)
+    root = tmp_path / "notes"
+    (root / "sub").mkdir(parents=True)
+    monkeypatch.setattr(api, "INGEST_ROOT", str(root))
+    yield api
+    api.store.close()
+
+
+def test_ingest_is_off_without_root(api, monkeypatch):
+    monkeypatch.setattr(api, "INGEST_ROOT", None)
+    response = TestClient(api.app).post("/ingest", json={"paths": ["sub"]})
+    assert response.status_code == 403
+
+
+@pytest.mark.parametrize("path", ["/etc", "~/.ssh", "../outside", "sub/../../outside"])
+def test_ingest_rejects_paths_outside_root(api, path):
+    response = TestClient(api.app).post("/ingest", json={"paths": ["sub", path]})
+    assert response.status_code == 403
+    assert not api.ingest_jobs
+
+
+def test_ingest_paths_resolve_under_root(api):
+    root = os.path.realpath(api.INGEST_ROOT)
+    assert api.resolve_ingest_paths(["sub", os.path.join(root, "sub")]) == [os.path.join(root, "sub")] * 2
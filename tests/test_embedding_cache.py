@@ -0,0 +1,15 @@
+import hashlib
+
+from rag.embedding_cache import text_key
+
+MODEL = "all-MiniLM-L6-v2"
+
+
+def test_normalized_vectors_get_their_own_keys():
+    assert text_key(MODEL, "Hello  World", normalize=True) != text_key(MODEL, "Hello  World")
+    assert text_key(MODEL, "hello world", normalize=True) == text_key(MODEL, "Hello  World", normalize=True)
+
+
+def test_raw_keys_are_unchanged():
+    # Disk caches written before normalize was part of the key stay valid
+    assert text_key(MODEL, "Hello  World") == hashlib.sha1(f"{MODEL}\0hello world".encode("utf-8")).hexdigest()
@@ -0,0 +1,32 @@
+# tests/test_journal.py
+
+import journal
+
+
+def test_append_drops_torn_last_line(tmp_path):
+    path = str(tmp_path / "day.jsonl")
+    assert [journal.append_record(path, {"n": i}) for i in range(3)] == [0, 1, 2]
+    with open(path, "ab") as f:
+        f.write(b'{"n": 3, "cut sh')
+    journal._counts.clear()
+    assert journal.append_record(path, {"n": 4}) == 3
+    assert list(journal.iter_records(path)) == [{"n": 0}, {"n": 1}, {"n": 2}, {"n": 4}]
+    assert not journal.needs_compaction(path)
+
+
+def test_repair_tail_keeps_a_complete_record_missing_its_newline(tmp_path):
+    path = str(tmp_path / "day.jsonl")
+    journal.append_record(path, {"n": 0})
+    with open(path, "ab") as f:
+        f.write(b'{"n": 1}')
+    assert journal.repair_tail(path)
+    assert not journal.repair_tail(path)
+    assert journal.append_record(path, {"n": 2}) == 2
+    assert journal.tail_records(path, 5) == [{"n": 0}, {"n": 1}, {"n": 2}]
+
+
+def test_repair_tail_of_a_single_torn_line(tmp_path):
+    path = tmp_path / "day.jsonl"
+    path.write_bytes(b'{"n": ')
+    assert journal.repair_tail(str(path))
+    assert path.read_bytes() == b""
@@ -0,0 +1,39 @@
+# tests/test_llm_client.py
+
+import asyncio
+
+from benchmarks.stubs import STUB_REPLY, StubLLMServer
+from llm_client import AsyncLLMClient, LLMClient
+
+MESSAGES = [{"role": "user", "content": "hi"}]
+
+
+def test_stream_chat_decodes_utf8():
+    with StubLLMServer() as server:
+        client = LLMClient(url=server.url)
+        try:
+            reply = "".join(client.stream_chat(MESSAGES)).strip()
+        finally:
+            client.close()
+    assert reply == STUB_REPLY
+
+
+def test_chat_decodes_utf8():
+    with StubLLMServer() as server:
+        client = LLMClient(url=server.url)
+        try:
+            assert client.chat(MESSAGES) == STUB_REPLY
+        finally:
+            client.close()
+
+
+def test_async_stream_chat_decodes_utf8():
+    async def stream(url):
+        client = AsyncLLMClient(url=url)
+        try:
+            return "".join([delta async for delta in client.stream_chat(MESSAGES)]).strip()
+        finally:
+            await client.aclose()
+
+    with StubLLMServer() as server:
+        assert asyncio.run(stream(server.url)) == STUB_REPLY
@@ -0,0 +1,26 @@
+# tests/test_metrics.py
+
+import json
+
+import metrics
+
+
+def test_render_sums_process_files_without_blocking_observe(tmp_path, monkeypatch):
+    monkeypatch.setattr(metrics, "METRICS_DIR", str(tmp_path))
+    monkeypatch.setattr(metrics, "_histograms", {})
+    monkeypatch.setattr(metrics, "_process_file", None)
+    monkeypatch.setattr(metrics, "_flusher", object())  # no timer thread; flushed by hand below
+    # Another process's file, e.g. the index writer's
+    other = [[0] * (len(metrics.BUCKETS) + 1), 2, 0.5]
+    other[0][3] = 2
+    (tmp_path / "1-1.json").write_text(json.dumps({"index_append": other}))
+
+    metrics.observe("index_append", 0.004)
+    # Nothing is written on the observing thread
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["1-1.json"]
+    assert 'stage="index_append"} 2\n' in metrics.render()
+
+    metrics._flush()
+    rendered = metrics.render()
+    assert 'chatbot_stage_duration_seconds_count{stage="index_append"} 3' in rendered
+    assert 'chatbot_stage_duration_seconds_bucket{stage="index_append",le="0.01"} 3' in rendered
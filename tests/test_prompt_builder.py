@@ -0,0 +1,36 @@
+# tests/test_prompt_builder.py
+
+import sys
+import threading
+import time
+import types
+
+import prompt_builder
+
+
+class SlowTokenizer:
+    """One token per word, and slow to load."""
+
+    @classmethod
+    def from_pretrained(cls, name, local_files_only=False):
+        time.sleep(0.2)
+        return cls()
+
+    def encode(self, text, add_special_tokens=False):
+        return text.split()
+
+
+def test_callers_wait_for_the_tokenizer_instead_of_caching_estimates(monkeypatch):
+    monkeypatch.setitem(sys.modules, "transformers", types.SimpleNamespace(AutoTokenizer=SlowTokenizer))
+    monkeypatch.setattr(prompt_builder, "_tokenizer", None)
+    monkeypatch.setattr(prompt_builder, "_tokenizer_loaded", False)
+    prompt_builder.count_tokens.cache_clear()
+    text = "a b c " * 10  # 30 words, 60 characters
+    counts = []
+    threads = [threading.Thread(target=lambda: counts.append(prompt_builder.count_tokens(text))) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    prompt_builder.count_tokens.cache_clear()
+    assert counts == [30] * 4
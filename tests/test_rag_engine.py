@@ -0,0 +1,52 @@
+import threading
+
+from benchmarks.stubs import StubEmbedder
+from rag import rag_engine, vector_store
+
+MESSAGES = 2000
+
+
+class GatedEmbedder(StubEmbedder):
+    """Embeds one batch, then waits until the test lets it go on."""
+
+    def __init__(self):
+        super().__init__()
+        self.first_batch = threading.Event()
+        self.resume = threading.Event()
+
+    def embed_texts(self, texts):
+        self.first_batch.set()
+        self.resume.wait()
+        return super().embed_texts(texts)
+
+
+class NoSummaries:
+    def between(self):
+        return []
+
+
+def test_close_stops_the_build_between_batches(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    embedder = GatedEmbedder()
+    monkeypatch.setattr(rag_engine, "Embedder", lambda **kwargs: embedder)
+    monkeypatch.setattr(rag_engine, "list_session_days", lambda: ["2024-01-01"])
+    monkeypatch.setattr(rag_engine, "iter_session_history", lambda day: (
+        (i, {"role": "user", "content": f"message number {i}"}) for i in range(MESSAGES)))
+    monkeypatch.setattr(rag_engine, "get_summary_catalog", NoSummaries)
+
+    engine = rag_engine.RAGEngine()
+    engine.build_index_in_background()
+    assert embedder.first_batch.wait(10)
+    closer = threading.Thread(target=engine.close)
+    closer.start()
+    # close() asks the build to stop before it joins it
+    assert engine._stop_indexing.wait(10)
+    embedder.resume.set()
+    closer.join(30)
+    assert not closer.is_alive()
+
+    reopened = vector_store.VectorStore(name=vector_store.GLOBAL_INDEX, embedder=StubEmbedder())
+    try:
+        assert 0 < reopened.size < MESSAGES
+    finally:
+        reopened.close()
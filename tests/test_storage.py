@@ -0,0 +1,37 @@
+# tests/test_storage.py
+
+import pytest
+
+from storage import MemorySessionStore, SQLiteSessionStore, encode_cursor
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path):
+    store = MemorySessionStore() if request.param == "memory" else SQLiteSessionStore(str(tmp_path / "api.sqlite"))
+    for i in range(3):
+        store.create_session({"id": f"s{i}", "title": "Chat", "created_at": f"2026-01-0{i + 1}T12:00:00"})
+        store.append_messages("s0", [{"role": "user", "content": f"m{i}", "timestamp": "2026-01-01T12:00:00"}])
+    yield store
+    store.close()
+
+
+def test_cursors_page_through(store):
+    sessions, cursor = store.list_sessions(2)
+    more, end = store.list_sessions(2, cursor)
+    assert [s["id"] for s in sessions + more] == ["s2", "s1", "s0"] and end is None
+    messages, cursor = store.get_messages("s0", 2)
+    more, end = store.get_messages("s0", 2, cursor)
+    assert [m["content"] for m in messages + more] == ["m0", "m1", "m2"] and end is None
+
+
+# Not base64 / JSON, a bare number, an object, and lists of the wrong length or types
+BAD_CURSORS = ["zzz", "MQ==", "e30=", encode_cursor(), encode_cursor("a", "b", "c"),
+               encode_cursor(1, 2), encode_cursor("x"), encode_cursor(True), encode_cursor(None)]
+
+
+@pytest.mark.parametrize("cursor", BAD_CURSORS)
+def test_malformed_cursors_are_rejected(store, cursor):
+    with pytest.raises(ValueError, match="Invalid cursor"):
+        store.list_sessions(2, cursor)
+    with pytest.raises(ValueError, match="Invalid cursor"):
+        store.get_messages("s0", 2, cursor)
@@ -0,0 +1,37 @@
+# timing.py
+# Records how long each startup phase takes, including phases that run in
+# background threads. `python main.py --timings` prints the report.
+
+import threading
+import time
+from contextlib import contextmanager
+
+_start = time.perf_counter()
+_lock = threading.Lock()
+_phases = []  # (name, thread name, start offset, duration or None while running)
+
+
+@contextmanager
+def phase(name):
+    """Times the enclosed block as a named startup phase."""
+    begin = time.perf_counter()
+    with _lock:
+        slot = len(_phases)
+        _phases.append((name, threading.current_thread().name, begin - _start, None))
+    try:
+        yield
+    finally:
+        with _lock:
+            _phases[slot] = (*_phases[slot][:3], time.perf_counter() - begin)
+
+
+def report(title="Startup timings"):
+    """Returns a printable table of all phases recorded so far."""
+    with _lock:
+        phases = list(_phases)
+    lines = [f"⏱️ {title} (t+{time.perf_counter() - _start:.2f}s):"]
+    for name, thread, offset, duration in phases:
+        where = "" if thread == "MainThread" else f" [{thread}]"
+        took = "running…" if duration is None else f"{duration * 1000:8.1f} ms"
+        lines.append(f"   t+{offset:6.2f}s {took:>11}  {name}{where}")
+    return "\n".join(lines)